@@ -0,0 +1,136 @@
+"""Compare the bounded App Attest decoder with plain `cbor2.loads`.
+
+Times decoding a representative attestation object plus the authData
+field checks, and how each decoder handles hostile input. The unbounded
+decoder is run on hostile input in a child process, because it can
+crash the interpreter. Run from the repository root:
+
+    python scripts/bench_cbor.py
+"""
+
+import os
+import sys
+import base64
+import timeit
+import hashlib
+import subprocess
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(root, "src"))
+
+import cbor2  # noqa: E402
+import apple  # noqa: E402
+from apps import registry as app_registry  # noqa: E402
+from constants import (  # noqa: E402
+    app_id,
+    rp_id_hash_end,
+    counter_start,
+    counter_end,
+    aaguid_start,
+    aaguid_end,
+    cred_id_start,
+)
+
+
+def attestation_object():
+    key_id = os.urandom(32)
+    auth_data = (
+        hashlib.sha256(app_id.encode()).digest()
+        + b"\x40"
+        + b"\x00\x00\x00\x00"
+        + b"appattestdevelop"
+        + len(key_id).to_bytes(2, "big")
+        + key_id
+        + os.urandom(77)
+    )
+    statement = {
+        "fmt": "apple-appattest",
+        "attStmt": {
+            "x5c": [os.urandom(780), os.urandom(580)],
+            "receipt": os.urandom(3200),
+        },
+        "authData": auth_data,
+    }
+    return base64.b64encode(cbor2.dumps(statement)).decode(), key_id
+
+
+def unbounded(encoded, key_id):
+    obj = cbor2.loads(base64.b64decode(encoded))
+    auth_data = obj["authData"]
+    app_id_hash = hashlib.sha256(app_id.encode()).hexdigest()
+    return (
+        auth_data[:rp_id_hash_end].hex() == app_id_hash
+        and auth_data[counter_start:counter_end] == bytearray(b"\x00\x00\x00\x00")
+        and auth_data[aaguid_start:aaguid_end] == bytearray(b"appattestdevelop")
+        and auth_data[cred_id_start : cred_id_start + len(key_id)] == key_id
+    )
+
+
+def bounded(encoded, key_id):
+    obj = apple.decode_apple_attestation_object(encoded)
+    auth_data = memoryview(obj["authData"])
+    return (
+        auth_data[:rp_id_hash_end] == app_registry.default.rp_id_hash
+        and auth_data[counter_start:counter_end] == b"\x00\x00\x00\x00"
+        and auth_data[aaguid_start:aaguid_end] == b"appattestdevelop"
+        and auth_data[cred_id_start : cred_id_start + len(key_id)] == key_id
+    )
+
+
+def unbounded_in_child(data):
+    code = (
+        "import sys, cbor2, time;"
+        "data = sys.stdin.buffer.read();"
+        "start = time.perf_counter()\n"
+        "try:\n"
+        "    cbor2.loads(data); result = 'accepted'\n"
+        "except Exception as e:\n"
+        "    result = type(e).__name__\n"
+        "print(result, round((time.perf_counter() - start) * 1e6, 1))"
+    )
+    child = subprocess.run(
+        [sys.executable, "-c", code], input=data, capture_output=True, timeout=60
+    )
+    if child.returncode < 0:
+        return f"crashed (signal {-child.returncode})"
+    result, micros = child.stdout.decode().split()
+    return f"{result} in {micros} us"
+
+
+def bounded_rejection(data):
+    encoded = base64.b64encode(data).decode()
+    number = 200
+    elapsed = timeit.timeit(
+        lambda: apple.decode_apple_attestation_object(encoded), number=number
+    )
+    rejected = apple.decode_apple_attestation_object(encoded) is None
+    verdict = "rejected" if rejected else "accepted"
+    return f"{verdict} in {elapsed / number * 1e6:.1f} us"
+
+
+def main():
+    encoded, key_id = attestation_object()
+    assert unbounded(encoded, key_id) and bounded(encoded, key_id)
+
+    number = 20000
+    old = timeit.timeit(lambda: unbounded(encoded, key_id), number=number)
+    new = timeit.timeit(lambda: bounded(encoded, key_id), number=number)
+    print(f"valid attestation object ({len(encoded)} bytes base64)")
+    print(f"  cbor2.loads + slicing     {old / number * 1e6:8.1f} us")
+    print(f"  bounded + memoryview      {new / number * 1e6:8.1f} us")
+
+    hostile = {
+        "100k nested arrays": b"\x81" * 100000 + b"\x00",
+        "array claiming 2^32 items": b"\x9a\xff\xff\xff\xff",
+        "truncated 4 GiB byte string": b"\x5a\xff\xff\xff\x00" + b"a" * 16,
+        "64 KiB of small ints": b"\x9a\x00\x01\x00\x00" + b"\x00" * 65536,
+    }
+    print("hostile input")
+    for name, data in hostile.items():
+        print(f"  {name}")
+        print(f"    cbor2.loads             {unbounded_in_child(data)}")
+        print(f"    bounded                 {bounded_rejection(data)}")
+
+
+if __name__ == "__main__":
+    main()
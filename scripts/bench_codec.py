@@ -0,0 +1,105 @@
+"""Compare the standard library json module with src/codec.py.
+
+Times the payloads the controller handles on every attestation: an
+inbound request_attestation_v2 webhook, the offer template, and the
+outbound DRPC response. Run from the repository root:
+
+    python scripts/bench_codec.py
+"""
+
+import os
+import sys
+import json
+import base64
+import timeit
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(root, "src"))
+
+import codec  # noqa: E402
+
+
+def fixture(name):
+    with open(os.path.join(root, "fixtures", name), "rb") as f:
+        return f.read()
+
+
+def attestation_webhook():
+    # An App Attest object is typically 5-6 KiB once base64 encoded.
+    attestation_object = base64.b64encode(os.urandom(4 * 1024)).decode()
+    message = {
+        "connection_id": "3ecb6447-fc2a-4291-8079-4c1e2a1b7a11",
+        "thread_id": "5d1c8a6e-5a2b-4a0e-9c1e-8b1f4f3e2d10",
+        "request": {
+            "request": {
+                "jsonrpc": "2.0",
+                "method": "request_attestation_v2",
+                "id": 1,
+                "params": {
+                    "attestation_object": attestation_object,
+                    "platform": "apple",
+                    "app_version": "1.0.0",
+                    "os_version": "iOS 17.4",
+                    "key_id": base64.b64encode(os.urandom(32)).decode(),
+                },
+            }
+        },
+    }
+    return json.dumps(message).encode()
+
+
+def load_template_stdlib(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def measure(label, stdlib, fast, number):
+    stdlib_us = timeit.timeit(stdlib, number=number) / number * 1e6
+    fast_us = timeit.timeit(fast, number=number) / number * 1e6
+    print(f"{label:<36} {stdlib_us:>9.2f} {fast_us:>9.2f} {stdlib_us / fast_us:>7.1f}x")
+
+
+def main():
+    number = 20000
+    request_attestation = fixture("request_attestation.json")
+    webhook = attestation_webhook()
+    offer = fixture("offer.json")
+    offer_obj = json.loads(offer)
+    response = {"response": {"jsonrpc": "2.0", "result": {"status": "success"}}}
+
+    print(f"backend: {'orjson' if codec.orjson else 'json'}")
+    print(f"{'payload':<36} {'json us':>9} {'codec us':>9} {'speedup':>8}")
+    measure(
+        "loads request_attestation.json",
+        lambda: json.loads(request_attestation.decode()),
+        lambda: codec.loads(request_attestation),
+        number,
+    )
+    measure(
+        f"loads attestation webhook ({len(webhook) // 1024} KiB)",
+        lambda: json.loads(webhook.decode()),
+        lambda: codec.loads(webhook),
+        number,
+    )
+    measure(
+        "load offer.json template",
+        lambda: load_template_stdlib(os.path.join(root, "fixtures", "offer.json")),
+        lambda: codec.load_file(os.path.join(root, "fixtures", "offer.json")),
+        number,
+    )
+    measure(
+        "dumps offer",
+        lambda: json.dumps(offer_obj),
+        lambda: codec.dumps(offer_obj),
+        number,
+    )
+    measure(
+        "dumps drpc response",
+        lambda: json.dumps(response),
+        lambda: codec.dumps(response),
+        number,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Report controller import time and per worker memory.
+
+Run from the repository root:
+
+    python scripts/bench_startup.py --workers 2 --preload
+
+Exits non-zero when a `--max-*` threshold is exceeded, so it can guard
+against startup regressions in CI.
+"""
+
+import os
+import re
+import sys
+import time
+import socket
+import argparse
+import subprocess
+
+src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def read_kb(pid, path, field):
+    try:
+        with open(f"/proc/{pid}/{path}") as f:
+            match = re.search(rf"^{field}:\s+(\d+) kB", f.read(), re.MULTILINE)
+    except OSError:
+        return None
+
+    return int(match.group(1)) if match else None
+
+
+def memory_mb(pid):
+    rss = read_kb(pid, "status", "VmRSS")
+    # PSS splits pages shared with the master between the processes, which
+    # is what shows the benefit of preloading.
+    pss = read_kb(pid, "smaps_rollup", "Pss")
+    return (
+        round(rss / 1024, 1) if rss else None,
+        round(pss / 1024, 1) if pss else None,
+    )
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The process name is in parens and may itself contain spaces.
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        if ppid == pid:
+            found.append(int(entry))
+
+    return found
+
+
+def measure_import(env):
+    code = (
+        "import re, controller;"
+        "status = open('/proc/self/status').read();"
+        "print(re.search(r'VmRSS:\\s+(\\d+)', status).group(1))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=src,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # -X importtime lines: "import time: self [us] | cumulative | name", with
+    # the name indented two spaces per nesting level.
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if match:
+            depth = (len(match.group(3)) - 1) // 2
+            imports.append((int(match.group(2)), depth, match.group(4)))
+
+    total_us = sum(cumulative for cumulative, depth, _ in imports if depth == 0)
+    heaviest = sorted((i for i in imports if i[1] <= 1), reverse=True)[:10]
+    rss_mb = int(result.stdout.strip().splitlines()[-1]) / 1024
+
+    return total_us / 1000, rss_mb, heaviest
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_workers(env, workers, preload, settle):
+    port = free_port()
+    cmd = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "-w",
+        str(workers),
+        "-b",
+        f"127.0.0.1:{port}",
+        "controller:server",
+    ]
+    if preload:
+        cmd.insert(3, "--preload")
+
+    master = subprocess.Popen(
+        cmd, cwd=src, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        start = time.monotonic()
+        while time.monotonic() - start < 30:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                if len(children(master.pid)) >= workers:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.1)
+        else:
+            raise RuntimeError("gunicorn did not start within 30s")
+
+        boot_s = time.monotonic() - start
+        time.sleep(settle)
+
+        return (
+            boot_s,
+            memory_mb(master.pid),
+            [memory_mb(pid) for pid in children(master.pid)],
+        )
+    finally:
+        master.terminate()
+        master.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--preload", action="store_true")
+    parser.add_argument(
+        "--warm-up", action="store_true", help="run the warm-up stage on import"
+    )
+    parser.add_argument("--settle", type=float, default=1.0)
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-worker-rss-mb", type=float)
+    args = parser.parse_args()
+
+    env = dict(os.environ, WARM_UP="true" if args.warm_up else "false")
+
+    import_ms, import_rss, heaviest = measure_import(env)
+    print(f"import controller: {import_ms:.1f} ms, RSS {import_rss:.1f} MiB")
+    for cumulative, _, name in heaviest:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    boot_s, master, workers = measure_workers(
+        env, args.workers, args.preload, args.settle
+    )
+    print(f"gunicorn boot: {boot_s:.2f} s (preload={args.preload})")
+    print(f"  master  RSS {master[0]} MiB, PSS {master[1]} MiB")
+    for rss, pss in workers:
+        print(f"  worker  RSS {rss} MiB, PSS {pss} MiB")
+
+    failed = False
+    if args.max_import_ms and import_ms > args.max_import_ms:
+        print(f"FAIL: import took {import_ms:.1f} ms > {args.max_import_ms} ms")
+        failed = True
+    worst_rss = max((rss or 0 for rss, _ in workers), default=0)
+    if args.max_worker_rss_mb and worst_rss > args.max_worker_rss_mb:
+        print(f"FAIL: worker RSS {worst_rss} MiB > {args.max_worker_rss_mb} MiB")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
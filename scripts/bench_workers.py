@@ -0,0 +1,152 @@
+"""Compare gunicorn worker models on the DRPC endpoints.
+
+Starts the controller under `src/gunicorn.conf.py` once per worker model,
+against the fake Redis and Traction from `fakes.py`, and drives
+request_nonce_v2 followed by request_attestation_v2 from concurrent
+clients. Run from the repository root:
+
+    python scripts/bench_workers.py --models sync gthread gevent \\
+        --concurrency 32 --duration 20 --traction-latency 0.05
+"""
+
+import os
+import time
+import uuid
+import argparse
+import threading
+import importlib.util
+import requests
+from fakes import free_port, start_fakes, start_controller
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+src = os.path.join(root, "src")
+
+
+def drpc_message(method, params=None):
+    return {
+        "connection_id": str(uuid.uuid4()),
+        "thread_id": str(uuid.uuid4()),
+        "request": {
+            "request": {"jsonrpc": "2.0", "method": method, "id": 1, "params": params}
+        },
+    }
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def client(url, deadline, latencies, errors):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        nonce = drpc_message("request_nonce_v2")
+        attestation = drpc_message(
+            "request_attestation_v2",
+            {
+                "attestation_object": "bm90IGFuIGF0dGVzdGF0aW9u",
+                "platform": "apple",
+                "app_version": "1.0.0",
+                "os_version": "iOS 17.0",
+                "key_id": "a2V5",
+            },
+        )
+        # Same connection, so the attestation finds the cached nonce.
+        attestation["connection_id"] = nonce["connection_id"]
+
+        for name, message in [("nonce", nonce), ("attestation", attestation)]:
+            start = time.monotonic()
+            try:
+                response = session.post(
+                    f"{url}/topic/drpc_request/", json=message, timeout=30
+                )
+                ok = response.status_code == 204
+            except requests.RequestException:
+                ok = False
+            latencies[name].append(time.monotonic() - start)
+            if not ok:
+                errors.append(name)
+
+
+def run_model(model, args, redis_uri, traction_url):
+    port = free_port()
+    server = start_controller(
+        src,
+        port,
+        redis_uri,
+        traction_url,
+        GUNICORN_WORKER_CLASS=model,
+        GUNICORN_WORKERS=str(args.workers),
+        # gunicorn silently switches sync workers to gthread when threads > 1
+        GUNICORN_THREADS=str(1 if model == "sync" else args.threads),
+    )
+    try:
+        latencies = {"nonce": [], "attestation": []}
+        errors = []
+        deadline = time.monotonic() + args.duration
+        clients = [
+            threading.Thread(
+                target=client,
+                args=(f"http://127.0.0.1:{port}", deadline, latencies, errors),
+            )
+            for _ in range(args.concurrency)
+        ]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+
+        return latencies, errors
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", default=["sync", "gthread", "gevent"])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument(
+        "--traction-latency",
+        type=float,
+        default=0.05,
+        help="seconds the fake Traction waits before answering",
+    )
+    args = parser.parse_args()
+
+    fakes, redis_uri, traction_url = start_fakes(args.traction_latency)
+
+    print(
+        f"{'model':<8} {'req/s':>8} {'errors':>7} "
+        f"{'nonce p50/p95/p99 ms':>24} {'attestation p50/p95/p99 ms':>30}"
+    )
+    for model in args.models:
+        if model == "gevent" and importlib.util.find_spec("gevent") is None:
+            print(f"{model:<8} skipped, gevent is not installed")
+            continue
+
+        latencies, errors = run_model(model, args, redis_uri, traction_url)
+        total = sum(len(samples) for samples in latencies.values())
+        columns = []
+        for name in ["nonce", "attestation"]:
+            samples = latencies[name]
+            columns.append(
+                "/".join(
+                    f"{percentile(samples, pct) * 1000:.0f}" for pct in [50, 95, 99]
+                )
+            )
+        print(
+            f"{model:<8} {total / args.duration:>8.1f} {len(errors):>7} "
+            f"{columns[0]:>24} {columns[1]:>30}"
+        )
+
+    fakes.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""Local stand-ins for the controller's dependencies.
+
+Used by the benchmark, replay and soak tools so they can drive a real
+controller without a Redis Cluster, a Traction tenant or Google. The fake
+Traction also answers for Google under /google/, see
+`fake_service_account`. Run on its own to use them by hand:
+
+    python scripts/fakes.py --redis-port 6390 --traction-port 8090
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import base64
+import socket
+import argparse
+import threading
+import subprocess
+import socketserver
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough RESP for a single node Redis Cluster client."""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.decode().split()
+
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+
+        return args
+
+    def write(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, Exception):
+            self.wfile.write(f"-ERR {value}\r\n".encode())
+        elif isinstance(value, bool):
+            self.wfile.write(b"+OK\r\n")
+        elif isinstance(value, int):
+            self.wfile.write(f":{value}\r\n".encode())
+        elif isinstance(value, list):
+            self.wfile.write(f"*{len(value)}\r\n".encode())
+            for item in value:
+                self.write(item)
+        else:
+            data = str(value).encode()
+            self.wfile.write(f"${len(data)}\r\n".encode() + data + b"\r\n")
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            try:
+                reply = self.server.store.execute(
+                    self.server.address, args[0].upper(), args[1:]
+                )
+            except Exception as e:
+                reply = e
+            self.write(reply)
+            self.wfile.flush()
+
+
+class FakeRedisStore:
+    def __init__(self):
+        self.data = {}
+        self.streams = {}
+        self.sorted_sets = {}
+        self.commands = 0
+        self.lock = threading.Lock()
+
+    def live(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, address, command, args):
+        with self.lock:
+            self.commands += 1
+            if command == "PING":
+                return True
+            if command == "CLUSTER" and args[0].upper() == "SLOTS":
+                return [[0, 16383, [address[0], address[1]]]]
+            if command == "CONFIG":
+                return [args[1], "no"]
+            if command == "GET":
+                return self.live(args[0])
+            if command == "SETEX":
+                self.data[args[0]] = (args[2], time.monotonic() + int(args[1]))
+                return True
+            if command == "SET":
+                expires_at = None
+                if "EX" in [a.upper() for a in args[2:]]:
+                    seconds = args[[a.upper() for a in args].index("EX") + 1]
+                    expires_at = time.monotonic() + int(seconds)
+                self.data[args[0]] = (args[1], expires_at)
+                return True
+            if command == "DEL":
+                return sum(self.data.pop(key, None) is not None for key in args)
+            if command == "EXPIRE":
+                value = self.live(args[0])
+                if value is None:
+                    return 0
+                self.data[args[0]] = (value, time.monotonic() + int(args[1]))
+                return 1
+            if command == "XADD":
+                # XADD key [MAXLEN [~] count] id field value ...
+                entries = self.streams.setdefault(args[0], [])
+                fields = args[args.index("*") + 1 :]
+                entries.append(dict(zip(fields[::2], fields[1::2])))
+                return f"{len(entries)}-0"
+            if command == "XLEN":
+                return len(self.streams.get(args[0], []))
+            if command == "ZADD":
+                members = self.sorted_sets.setdefault(args[0], {})
+                added = [m for m in args[2::2] if m not in members]
+                members.update(zip(args[2::2], map(float, args[1::2])))
+                return len(added)
+            if command == "ZREM":
+                members = self.sorted_sets.get(args[0], {})
+                return sum(members.pop(m, None) is not None for m in args[1:])
+            if command in ("ZCOUNT", "ZREMRANGEBYSCORE"):
+                members = self.sorted_sets.get(args[0], {})
+                low, high = float(args[1]), float(args[2])
+                matched = [m for m, score in members.items() if low <= score <= high]
+                if command == "ZREMRANGEBYSCORE":
+                    for member in matched:
+                        del members[member]
+                return len(matched)
+            raise ValueError(f"unknown command '{command}'")
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), FakeRedisHandler)
+        self.store = FakeRedisStore()
+        self.address = self.server_address
+
+    @property
+    def uri(self):
+        return f"redis://{self.address[0]}:{self.address[1]}/0"
+
+
+def fake_jwt(lifetime=60 * 60 * 24):
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=")
+
+    header = encode({"alg": "HS256", "typ": "JWT"})
+    payload = encode({"exp": int(time.time()) + lifetime})
+    return b".".join([header, payload, b"c2lnbmF0dXJl"]).decode()
+
+
+def fake_integrity_token(nonce):
+    # Unique per call, so the verdict cache doesn't hide the Google call.
+    return f"fake-integrity.{nonce}.{base64.urlsafe_b64encode(os.urandom(12)).decode()}"
+
+
+def fake_verdict(package, token):
+    # A passing verdict for the nonce in a `fake_integrity_token`.
+    nonce = token.split(".")[1]
+    return {
+        "tokenPayloadExternal": {
+            "requestDetails": {
+                "requestPackageName": package,
+                "nonce": nonce,
+                "timestampMillis": str(int(time.time() * 1000)),
+            },
+            "appIntegrity": {
+                "appRecognitionVerdict": "PLAY_RECOGNIZED",
+                "packageName": package,
+                "certificateSha256Digest": ["ZmFrZQ"],
+                "versionCode": "1000",
+            },
+            "deviceIntegrity": {"deviceRecognitionVerdict": ["MEETS_DEVICE_INTEGRITY"]},
+            "accountDetails": {"appLicensingVerdict": "LICENSED"},
+        }
+    }
+
+
+def fake_service_account(path, traction_url):
+    """Write a service account key whose tokens come from the fake Google.
+
+    Run the controller with GOOGLE_AUTH_JSON_PATH set to `path` and
+    PLAY_INTEGRITY_ENDPOINT set to the returned URL.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "type": "service_account",
+                "project_id": "fake",
+                "private_key_id": "fake",
+                "private_key": pem.decode(),
+                "client_email": "fake@fake.iam.gserviceaccount.com",
+                "client_id": "1",
+                "token_uri": f"{traction_url}/google/token",
+            },
+            f,
+        )
+
+    return f"{traction_url}/google/"
+
+
+class FakeTractionHandler(BaseHTTPRequestHandler):
+    routes = [
+        ("POST", r"/multitenancy/tenant/[^/]+/token", "token"),
+        ("GET", r"/connections/[^/]+", "connection"),
+        ("POST", r"/drpc/[^/]+/(request|response)", "drpc"),
+        ("POST", r"/issue-credential/send-offer", "offer"),
+        ("GET", r"/schemas/created", "schemas"),
+        ("GET", r"/credential-definitions/created", "cred_defs"),
+        ("POST", r"/schemas", "create_schema"),
+        ("POST", r"/credential-definitions", "create_cred_def"),
+        ("POST", r"/google/token", "google_token"),
+        ("POST", r"/google/v1/[^/:]+:decodeIntegrityToken", "decode"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            # Google's token request is form encoded.
+            body = {}
+        time.sleep(self.server.latency)
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        for route_method, pattern, name in self.routes:
+            if route_method == method and re.fullmatch(pattern, url.path):
+                break
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.server.record(name, body)
+        if name == "token":
+            reply = {"token": fake_jwt()}
+        elif name == "connection":
+            reply = {"connection_id": url.path.split("/")[-1], "state": "active"}
+        elif name == "schemas":
+            reply = {"schema_ids": query.get("schema_id", [])}
+        elif name == "cred_defs":
+            # Every schema has a single cred def, tagged "bcwallet".
+            did = query.get("schema_id", ["fake"])[0].split(":")[0]
+            reply = {"credential_definition_ids": [f"{did}:3:CL:1:bcwallet"]}
+        elif name == "create_schema":
+            reply = {"sent": {"schema_id": "fake:2:fake:1.0"}}
+        elif name == "create_cred_def":
+            did = body["schema_id"].split(":")[0]
+            cred_def_id = f"{did}:3:CL:1:{body['tag']}"
+            reply = {"sent": {"credential_definition_id": cred_def_id}}
+        elif name == "google_token":
+            reply = {"access_token": "fake", "expires_in": 3600, "token_type": "Bearer"}
+        elif name == "decode":
+            package = url.path.split("/")[-1].split(":")[0]
+            reply = fake_verdict(package, body["integrityToken"])
+        else:
+            reply = {}
+
+        data = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.respond("GET")
+
+    def do_POST(self):
+        self.respond("POST")
+
+
+class FakeTraction(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        super().__init__((host, port), FakeTractionHandler)
+        self.latency = latency
+        self.calls = {}
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def record(self, name, body):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if name == "drpc":
+                self.messages.append(body)
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+def start(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, what):
+    for _ in range(300):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+
+    raise RuntimeError(f"{what} did not start")
+
+
+def start_fakes(traction_latency=0.0):
+    """Run the fakes in a child process and return it with their URLs.
+
+    The fakes get their own process so they don't compete with load
+    generating threads for the GIL.
+    """
+    redis_port, traction_port = free_port(), free_port()
+    fakes = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--redis-port",
+            str(redis_port),
+            "--traction-port",
+            str(traction_port),
+            "--traction-latency",
+            str(traction_latency),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    wait_for_port(redis_port, "fake redis")
+    wait_for_port(traction_port, "fake traction")
+
+    return (
+        fakes,
+        f"redis://127.0.0.1:{redis_port}/0",
+        f"http://127.0.0.1:{traction_port}",
+    )
+
+
+def start_controller(src, port, redis_uri, traction_url, **settings):
+    """Start the controller in `src` under gunicorn, against the fakes.
+
+    Extra keyword arguments are passed as environment variables, for
+    example GUNICORN_WORKERS="4".
+    """
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        REDIS_URI=redis_uri,
+        TRACTION_BASE_URL=traction_url,
+        TRACTION_TENANT_ID="fake",
+        TRACTION_TENANT_API_KEY="fake",
+        TRACTION_LEGACY_DID="NXp6XcGeCR2MviWuY51Dva",
+        MESSAGE_TEMPLATES_PATH=os.path.join(root, "fixtures"),
+        APPLE_ATTESTATION_ROOT_CA_URL=f"{traction_url}/unused",
+        **settings,
+    )
+    # Builds without a gunicorn.conf.py still start with gunicorn defaults.
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}"]
+        + ["controller:server"],
+        cwd=src,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port, f"controller in {src}")
+    except RuntimeError:
+        server.terminate()
+        raise
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-port", type=int, default=6390)
+    parser.add_argument("--traction-port", type=int, default=8090)
+    parser.add_argument("--traction-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    redis = start(FakeRedis(port=args.redis_port))
+    traction = start(
+        FakeTraction(port=args.traction_port, latency=args.traction_latency)
+    )
+    print(f"REDIS_URI={redis.uri}")
+    print(f"TRACTION_BASE_URL={traction.url}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
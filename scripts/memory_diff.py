@@ -0,0 +1,120 @@
+"""Fetch and compare tracemalloc snapshots from a profiling controller.
+
+The controller must run with MEMORY_PROFILING=true and DEBUG_TOKEN set.
+Each request is answered by one worker, whose PID is printed, so fetch
+both snapshots from a controller running a single worker when comparing
+over time. Run from the repository root:
+
+    python scripts/memory_diff.py stages http://localhost:5000 --token $DEBUG_TOKEN
+    python scripts/memory_diff.py fetch http://localhost:5000 before.snap --token ...
+    python scripts/memory_diff.py fetch http://localhost:5000 after.snap --token ...
+    python scripts/memory_diff.py compare before.snap after.snap --top 20
+"""
+
+import argparse
+import tracemalloc
+import requests
+
+
+def get(url, path, token):
+    response = requests.get(
+        f"{url.rstrip('/')}{path}",
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=60,
+    )
+    response.raise_for_status()
+    return response
+
+
+def stages(args):
+    report = get(args.url, "/debug/memory", args.token).json()
+    if not report["enabled"]:
+        print("memory profiling is not enabled on this controller")
+        return
+
+    print(
+        f"pid {report['pid']}, traced {report['traced_current'] / 1024:.0f} KiB, "
+        f"peak {report['traced_peak'] / 1024:.0f} KiB"
+    )
+    print(
+        f"{'stage':<40} {'count':>7} {'avg KiB':>9} {'max KiB':>9} "
+        f"{'peak KiB':>9} {'avg ms':>8}"
+    )
+    for name, stats in sorted(report["stages"].items()):
+        print(
+            f"{name:<40} {stats['count']:>7} "
+            f"{stats['allocated_avg'] / 1024:>9.1f} "
+            f"{stats['allocated_max'] / 1024:>9.1f} "
+            f"{stats['peak_max'] / 1024:>9.1f} "
+            f"{stats['seconds_avg'] * 1000:>8.2f}"
+        )
+        if args.lines:
+            for line in stats["top_lines"]:
+                print(f"    {line['size_diff'] / 1024:>+9.1f} KiB  {line['line']}")
+
+
+def fetch(args):
+    response = get(args.url, "/debug/memory/snapshot", args.token)
+    with open(args.output, "wb") as f:
+        f.write(response.content)
+    print(f"wrote {args.output} from worker {response.headers.get('X-Worker-Pid')}")
+
+
+def compare(args):
+    before = tracemalloc.Snapshot.load(args.before)
+    after = tracemalloc.Snapshot.load(args.after)
+    if args.include:
+        include = [tracemalloc.Filter(True, f"*{args.include}*")]
+        before = before.filter_traces(include)
+        after = after.filter_traces(include)
+
+    stats = after.compare_to(before, args.key_type)
+    total = sum(stat.size_diff for stat in stats)
+    print(f"total {total / 1024:+.1f} KiB")
+    for stat in stats[: args.top]:
+        print(
+            f"{stat.size_diff / 1024:>+10.1f} KiB {stat.count_diff:>+8} blocks  "
+            f"{stat.traceback}"
+        )
+        if args.key_type == "traceback":
+            # Most recent call first, like the rest of the output.
+            for line in stat.traceback.format(most_recent_first=True):
+                print(f"    {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_stages = commands.add_parser("stages", help="print per stage stats")
+    parser_stages.add_argument("url")
+    parser_stages.add_argument("--token", required=True)
+    parser_stages.add_argument(
+        "--lines", action="store_true", help="also print the top allocating lines"
+    )
+    parser_stages.set_defaults(run=stages)
+
+    parser_fetch = commands.add_parser("fetch", help="download a snapshot")
+    parser_fetch.add_argument("url")
+    parser_fetch.add_argument("output")
+    parser_fetch.add_argument("--token", required=True)
+    parser_fetch.set_defaults(run=fetch)
+
+    parser_compare = commands.add_parser("compare", help="compare two snapshots")
+    parser_compare.add_argument("before")
+    parser_compare.add_argument("after")
+    parser_compare.add_argument("--top", type=int, default=20)
+    parser_compare.add_argument(
+        "--key-type", choices=["lineno", "filename", "traceback"], default="lineno"
+    )
+    parser_compare.add_argument(
+        "--include", help="only count traces from files matching this"
+    )
+    parser_compare.set_defaults(run=compare)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Provision the attestation schema and cred defs across Traction tenants.
+
+Reads a manifest of environments and their tenants, then checks and
+creates the schema and the tagged cred defs of every tenant concurrently.
+Each environment shares one pooled session. Resolved IDs are cached, so
+a later run skips tenants that are already provisioned unless
+`--refresh` is given. For each environment, the cred def IDs are written
+to `<output>/<environment>.json`, which the controller loads at startup
+from CRED_DEFS_PATH. Run from the repository root:
+
+    python scripts/provision.py manifest.json --output devops/cred_defs
+
+The manifest names the environment variables that hold each tenant's
+credentials, rather than the credentials themselves:
+
+    {
+        "environments": [
+            {
+                "name": "test",
+                "traction_base_url": "https://traction-tenant-proxy-test...",
+                "tenants": [
+                    {
+                        "name": "bcwallet",
+                        "did": "RGjWbW1eycP7FrMf4QJvX8",
+                        "tenant_id_env": "TEST_TRACTION_TENANT_ID",
+                        "api_key_env": "TEST_TRACTION_TENANT_API_KEY",
+                        "tags": ["bcwallet"]
+                    }
+                ]
+            }
+        ]
+    }
+"""
+
+import os
+import sys
+import json
+import argparse
+import threading
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+from cred_defs import parse_cred_def_id  # noqa: E402
+from constants import (  # noqa: E402
+    attestation_schema_name,
+    attestation_schema_version,
+)
+
+attributes = [
+    "issue_date_dateint",
+    "validation_method",
+    "app_version",
+    "app_vendor",
+    "app_id",
+    "operating_system",
+    "operating_system_version",
+]
+default_tags = ["bcwallet"]
+
+print_lock = threading.Lock()
+
+
+def log(key, message):
+    with print_lock:
+        print(f"{key:<30} {message}")
+
+
+class Tenant:
+    def __init__(self, environment, config, session):
+        self.key = f"{environment['name']}/{config['name']}"
+        self.base_url = environment["traction_base_url"]
+        self.did = config["did"]
+        self.tenant_id = os.environ[config["tenant_id_env"]]
+        self.api_key = os.environ[config["api_key_env"]]
+        self.tags = config.get("tags", default_tags)
+        self.session = session
+        self.token = None
+
+    def call(self, method, endpoint, **kwargs):
+        headers = {"Content-Type": "application/json", "accept": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        response = self.session.request(
+            method,
+            urljoin(self.base_url, endpoint),
+            headers=headers,
+            timeout=30,
+            **kwargs,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def authenticate(self):
+        self.token = self.call(
+            "POST",
+            f"multitenancy/tenant/{self.tenant_id}/token",
+            data=json.dumps({"api_key": self.api_key}),
+        )["token"]
+
+
+def created_cred_def_id(response):
+    # Traction answers with the cred def itself, or with the endorsement
+    # transaction when the tenant needs an endorser.
+    sent = response.get("sent") or {}
+    if sent.get("credential_definition_id"):
+        return sent["credential_definition_id"]
+    return response["txn"]["meta_data"]["context"]["cred_def_id"]
+
+
+def provision(tenant, schema):
+    tenant.authenticate()
+
+    schema_id = f"{tenant.did}:2:{schema['name']}:{schema['version']}"
+    found = tenant.call("GET", "/schemas/created", params={"schema_id": schema_id})
+    if found.get("schema_ids"):
+        log(tenant.key, f"schema {schema_id} exists")
+    else:
+        tenant.call(
+            "POST",
+            "/schemas",
+            data=json.dumps(
+                {
+                    "schema_name": schema["name"],
+                    "schema_version": schema["version"],
+                    "attributes": schema["attributes"],
+                }
+            ),
+        )
+        log(tenant.key, f"schema {schema_id} created")
+
+    cred_defs = {}
+    found = tenant.call(
+        "GET", "/credential-definitions/created", params={"schema_id": schema_id}
+    )
+    for cred_def_id in found.get("credential_definition_ids") or []:
+        parsed = parse_cred_def_id(cred_def_id)
+        if parsed is not None and parsed[0] == tenant.did:
+            # Listed oldest first, the latest of a tag wins.
+            cred_defs[parsed[1]] = cred_def_id
+
+    for tag in tenant.tags:
+        if tag in cred_defs:
+            log(tenant.key, f"cred def {cred_defs[tag]} exists")
+            continue
+        response = tenant.call(
+            "POST",
+            "/credential-definitions",
+            data=json.dumps(
+                {"schema_id": schema_id, "tag": tag, "support_revocation": False}
+            ),
+        )
+        cred_defs[tag] = created_cred_def_id(response)
+        log(tenant.key, f"cred def {cred_defs[tag]} created")
+
+    return {"schema_id": schema_id, "cred_defs": cred_defs}
+
+
+def is_provisioned(cached, tenant, schema):
+    schema_id = f"{tenant.did}:2:{schema['name']}:{schema['version']}"
+    return (
+        cached is not None
+        and cached["schema_id"] == schema_id
+        and all(tag in cached["cred_defs"] for tag in tenant.tags)
+    )
+
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_cache(path, cache):
+    with open(path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def write_artifact(path, resolved):
+    cred_def_ids = sorted(
+        cred_def_id
+        for result in resolved
+        for cred_def_id in result["cred_defs"].values()
+    )
+    with open(path, "w") as f:
+        json.dump({"cred_def_ids": cred_def_ids}, f, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("manifest")
+    parser.add_argument("--output", required=True, help="directory for the artifacts")
+    parser.add_argument("--cache", default=".provision-cache.json")
+    parser.add_argument(
+        "--refresh", action="store_true", help="check every tenant, ignore the cache"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    schema = {
+        "name": attestation_schema_name,
+        "version": attestation_schema_version,
+        "attributes": attributes,
+        **manifest.get("schema", {}),
+    }
+    cache = load_cache(args.cache)
+
+    tenants = {}
+    for environment in manifest["environments"]:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        tenants[environment["name"]] = [
+            Tenant(environment, config, session) for config in environment["tenants"]
+        ]
+
+    futures = {}
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for tenant in sum(tenants.values(), []):
+            if not args.refresh and is_provisioned(
+                cache.get(tenant.key), tenant, schema
+            ):
+                log(tenant.key, "cached")
+                continue
+            futures[tenant.key] = pool.submit(provision, tenant, schema)
+
+    failed = set()
+    for key, future in futures.items():
+        try:
+            cache[key] = future.result()
+        except Exception as e:
+            log(key, f"failed: {e}")
+            failed.add(key.split("/")[0])
+    save_cache(args.cache, cache)
+
+    os.makedirs(args.output, exist_ok=True)
+    for name, environment_tenants in tenants.items():
+        if name in failed:
+            log(name, "not written, a tenant failed")
+            continue
+        path = os.path.join(args.output, f"{name}.json")
+        write_artifact(path, [cache[tenant.key] for tenant in environment_tenants])
+        log(name, f"wrote {path}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Replay a DRPC capture against one or two builds of the controller.
+
+Reads the files written when the controller runs with DRPC_RECORD_PATH
+set, starts each build under gunicorn against fresh fakes from
+`fakes.py`, and plays the webhooks back in their recorded order. Redacted
+fields are filled back in with deterministic filler of the recorded
+length, so both builds see byte for byte the same requests. Run from the
+repository root, for example with the baseline checked out in a worktree:
+
+    git worktree add /tmp/baseline main
+    python scripts/replay.py /var/drpc --baseline /tmp/baseline/src \\
+        --candidate src --speed 4
+
+`--speed 1` keeps the original timing, `--speed 4` plays it four times
+faster and `--speed 0` sends as fast as `--concurrency` allows.
+
+Play Integrity attestations are replayed with a fake integrity token for
+the nonce the build cached for that connection, so they pass verification
+against the fake Google and go on to the offer, as they did when
+recorded. Both builds must support PLAY_INTEGRITY_ENDPOINT. App Attest
+objects can't be faked without a device key, so Apple attestations and
+assertions only replay the path up to the failed verification.
+"""
+
+import os
+import glob
+import json
+import time
+import base64
+import random
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import redis
+import requests
+from fakes import (
+    free_port,
+    start_fakes,
+    start_controller,
+    fake_service_account,
+    fake_integrity_token,
+)
+
+redacted_prefix = "~redacted:"
+
+
+def read_capture(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "drpc-*.jsonl*")))
+        else:
+            files.append(path)
+
+    records = []
+    for name in files:
+        with open(name, "rb") as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+
+    # Each worker writes its own file, merge them back into one timeline.
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+
+def fill(value, rng):
+    if isinstance(value, dict):
+        return {key: fill(item, rng) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, rng) for item in value]
+    if isinstance(value, str) and value.startswith(redacted_prefix):
+        length = int(value[len(redacted_prefix) :])
+        filler = base64.b64encode(rng.randbytes(length)).decode()
+        return filler[:length]
+
+    return value
+
+
+def is_google_attestation(call):
+    return (
+        isinstance(call, dict)
+        and str(call.get("method", "")).startswith("request_attestation")
+        and (call.get("params") or {}).get("platform") == "google"
+    )
+
+
+def google_calls(message):
+    request = (message.get("request") or {}).get("request")
+    calls = request if isinstance(request, list) else [request]
+    return [call for call in calls if is_google_attestation(call)]
+
+
+def materialize(records, seed):
+    rng = random.Random(seed)
+    start = records[0]["ts"] if records else 0
+    requests_ = []
+    for record in records:
+        message = fill(record["message"], rng)
+        requests_.append(
+            {
+                "offset": record["ts"] - start,
+                "path": f"/topic/{record['route']}/",
+                "method": record.get("method") or "unknown",
+                "body": json.dumps(message).encode(),
+                # Re-encoded at send time with a token for the live nonce.
+                "message": message if google_calls(message) else None,
+            }
+        )
+
+    return requests_
+
+
+def seeded_body(item, store):
+    message = item["message"]
+    nonce = store.get(message["connection_id"])
+    if nonce is None:
+        return item["body"]
+
+    for call in google_calls(message):
+        call["params"]["attestation_object"] = fake_integrity_token(nonce)
+    return json.dumps(message).encode()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def replay(url, redis_uri, requests_, speed, concurrency):
+    store = redis.Redis.from_url(redis_uri, decode_responses=True)
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    latencies = {}
+    errors = {}
+    lock = threading.Lock()
+
+    def send(item):
+        body = item["body"] if item["message"] is None else seeded_body(item, store)
+        start = time.monotonic()
+        try:
+            response = session.post(
+                url + item["path"],
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=60,
+            )
+            ok = response.status_code == 204
+        except requests.RequestException:
+            ok = False
+        elapsed = time.monotonic() - start
+        with lock:
+            latencies.setdefault(item["method"], []).append(elapsed)
+            if not ok:
+                errors[item["method"]] = errors.get(item["method"], 0) + 1
+
+    began = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for item in requests_:
+            if speed > 0:
+                delay = began + item["offset"] / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(send, item)
+    wall = time.monotonic() - began
+
+    return {"latencies": latencies, "errors": errors, "wall": wall}
+
+
+def run_build(name, src, requests_, args):
+    # Fresh fakes per build, so the second build doesn't see the nonces
+    # and offers the first one left behind.
+    fakes, redis_uri, traction_url = start_fakes(args.traction_latency)
+    tmp = tempfile.TemporaryDirectory()
+    auth_path = os.path.join(tmp.name, "service-account.json")
+    port = free_port()
+    try:
+        server = start_controller(
+            src,
+            port,
+            redis_uri,
+            traction_url,
+            GUNICORN_WORKERS=str(args.workers),
+            WARM_UP="false",
+            GOOGLE_AUTH_JSON_PATH=auth_path,
+            PLAY_INTEGRITY_ENDPOINT=fake_service_account(auth_path, traction_url),
+        )
+        try:
+            print(f"replaying {len(requests_)} webhooks against {name} ({src})")
+            return replay(
+                f"http://127.0.0.1:{port}",
+                redis_uri,
+                requests_,
+                args.speed,
+                args.concurrency,
+            )
+        finally:
+            server.terminate()
+            server.wait()
+    finally:
+        fakes.terminate()
+        tmp.cleanup()
+
+
+def summarize(result):
+    rows = {}
+    for method, samples in result["latencies"].items():
+        rows[method] = {
+            "count": len(samples),
+            "errors": result["errors"].get(method, 0),
+            "p50": percentile(samples, 50) * 1000,
+            "p95": percentile(samples, 95) * 1000,
+            "p99": percentile(samples, 99) * 1000,
+        }
+    total = sum(row["count"] for row in rows.values())
+    rows["all"] = {
+        "count": total,
+        "errors": sum(result["errors"].values()),
+        "p50": percentile(sum(result["latencies"].values(), []), 50) * 1000,
+        "p95": percentile(sum(result["latencies"].values(), []), 95) * 1000,
+        "p99": percentile(sum(result["latencies"].values(), []), 99) * 1000,
+    }
+    return rows, total / result["wall"] if result["wall"] else 0.0
+
+
+def change(old, new):
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def report(summaries):
+    header = f"{'build':<10} {'method':<24} {'count':>6} {'errors':>6}"
+    print(f"{header} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, (rows, throughput) in summaries.items():
+        for method, row in sorted(rows.items()):
+            print(
+                f"{name:<10} {method:<24} {row['count']:>6} {row['errors']:>6} "
+                f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f}"
+            )
+        print(f"{name:<10} {'throughput':<24} {throughput:>6.1f} req/s")
+
+    if len(summaries) != 2:
+        return
+
+    (_, (old, old_rps)), (_, (new, new_rps)) = summaries.items()
+    print("\ncandidate vs baseline")
+    for method in sorted(set(old) & set(new)):
+        print(
+            f"  {method:<24} p50 {change(old[method]['p50'], new[method]['p50']):>8}"
+            f"  p95 {change(old[method]['p95'], new[method]['p95']):>8}"
+            f"  p99 {change(old[method]['p99'], new[method]['p99']):>8}"
+            f"  errors {new[method]['errors'] - old[method]['errors']:+d}"
+        )
+    print(f"  {'throughput':<24} {change(old_rps, new_rps):>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", nargs="+", help="capture files or directories")
+    parser.add_argument("--baseline", required=True, help="src directory to replay")
+    parser.add_argument("--candidate", help="src directory to compare against")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="timing multiplier, 0 sends without waiting",
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--traction-latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0, help="seed for the filler")
+    args = parser.parse_args()
+
+    records = read_capture(args.capture)
+    if not records:
+        parser.error("the capture is empty")
+    requests_ = materialize(records, args.seed)
+
+    builds = {"baseline": args.baseline}
+    if args.candidate:
+        builds["candidate"] = args.candidate
+
+    summaries = {
+        name: summarize(run_build(name, os.path.abspath(src), requests_, args))
+        for name, src in builds.items()
+    }
+    report(summaries)
+
+
+if __name__ == "__main__":
+    main()
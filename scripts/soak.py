@@ -0,0 +1,337 @@
+"""Soak the controller and fail on resource leaks or latency drift.
+
+Starts the controller under `src/gunicorn.conf.py` against the fake Redis,
+Traction and Google from `fakes.py`, with worker recycling turned off so
+a leak can't hide behind it, and runs the whole flow from concurrent
+clients for `--duration` seconds: request_nonce_v2, a Play Integrity
+request_attestation_v2 for the cached nonce, then the issue credential
+webhooks for the offer.
+
+Every `--interval` seconds the workers' RSS, open file descriptors and
+established TCP connections are read from /proc. The medians of a window
+just after `--warmup` are compared with the medians of the last window of
+the run, as is the p95 latency of the flow, and the run fails when any of
+them grew by more than its threshold, when too many flows failed, or when
+a worker was replaced. Linux only. Run from the repository root:
+
+    python scripts/soak.py --duration 1800 --concurrency 8 --workers 2
+"""
+
+import os
+import sys
+import time
+import uuid
+import argparse
+import tempfile
+import threading
+import statistics
+import redis
+import requests
+from fakes import (
+    free_port,
+    start_fakes,
+    start_controller,
+    fake_service_account,
+    fake_integrity_token,
+)
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+src = os.path.join(root, "src")
+sys.path.insert(0, src)
+
+from constants import offer_key_prefix  # noqa: E402
+
+
+def drpc_message(connection_id, method, params=None):
+    return {
+        "connection_id": connection_id,
+        "thread_id": str(uuid.uuid4()),
+        "request": {
+            "request": {"jsonrpc": "2.0", "method": method, "id": 1, "params": params}
+        },
+    }
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def run_flow(session, url, store):
+    connection_id = str(uuid.uuid4())
+
+    def post(path, message):
+        response = session.post(f"{url}{path}", json=message, timeout=30)
+        response.raise_for_status()
+
+    post("/topic/drpc_request/", drpc_message(connection_id, "request_nonce_v2"))
+    nonce = store.get(connection_id)
+    if nonce is None:
+        raise RuntimeError("no nonce cached")
+
+    post(
+        "/topic/drpc_request/",
+        drpc_message(
+            connection_id,
+            "request_attestation_v2",
+            {
+                "attestation_object": fake_integrity_token(nonce),
+                "platform": "google",
+                "app_version": "1.0.0",
+                "os_version": "Android 14",
+            },
+        ),
+    )
+    # The DRPC answer goes to Traction, the offer being tracked is how a
+    # passing attestation shows.
+    if store.get(f"{offer_key_prefix}{connection_id}") is None:
+        raise RuntimeError("no offer sent")
+
+    for state in ["request_received", "credential_issued", "credential_acked"]:
+        post(
+            "/topic/issue_credential/",
+            {"connection_id": connection_id, "state": state},
+        )
+
+
+def client(url, redis_uri, started, deadline, flows):
+    session = requests.Session()
+    store = redis.Redis.from_url(redis_uri, decode_responses=True)
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            run_flow(session, url, store)
+            ok = True
+        except Exception:
+            ok = False
+        # list.append is atomic, no lock needed across clients.
+        flows.append((start - started, time.monotonic() - start, ok))
+
+
+def children(pid):
+    found = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # The command may contain spaces, the fields after it don't.
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            found.append(int(name))
+    return sorted(found)
+
+
+def rss_bytes(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def socket_inodes(pid):
+    inodes = set()
+    count = 0
+    for fd in os.listdir(f"/proc/{pid}/fd"):
+        count += 1
+        try:
+            target = os.readlink(f"/proc/{pid}/fd/{fd}")
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            inodes.add(target[8:-1])
+    return count, inodes
+
+
+def established_inodes():
+    inodes = set()
+    for path in ["/proc/net/tcp", "/proc/net/tcp6"]:
+        try:
+            with open(path) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] == "01":  # TCP_ESTABLISHED
+                        inodes.add(fields[9])
+        except OSError:
+            continue
+    return inodes
+
+
+def sample(master):
+    workers = children(master)
+    established = established_inodes()
+    rss = fds = connections = 0
+    for pid in workers:
+        try:
+            rss += rss_bytes(pid)
+            count, inodes = socket_inodes(pid)
+        except OSError:
+            # Exited between listing and reading.
+            continue
+        fds += count
+        connections += len(inodes & established)
+
+    return {"workers": workers, "rss": rss, "fds": fds, "connections": connections}
+
+
+def sampler(master, started, interval, stop, samples):
+    while not stop.wait(interval):
+        samples.append(dict(sample(master), t=time.monotonic() - started))
+
+
+def window_median(samples, key, start, end):
+    values = [s[key] for s in samples if start <= s["t"] < end]
+    return statistics.median(values) if values else None
+
+
+def window_flows(flows, start, end):
+    return [flow for flow in flows if start <= flow[0] < end]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=600)
+    parser.add_argument("--interval", type=float, default=5, help="seconds")
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=60,
+        help="seconds before the baseline window, for caches and pools to fill",
+    )
+    parser.add_argument(
+        "--window", type=float, default=60, help="seconds in each compared window"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument(
+        "--traction-latency",
+        type=float,
+        default=0.02,
+        help="seconds the fake Traction and Google wait before answering",
+    )
+    parser.add_argument("--max-rss-growth-mb", type=float, default=20)
+    parser.add_argument("--max-fd-growth", type=int, default=10)
+    parser.add_argument("--max-conn-growth", type=int, default=10)
+    parser.add_argument(
+        "--max-p95-drift",
+        type=float,
+        default=1.5,
+        help="largest ratio of the last window's p95 to the baseline's",
+    )
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    if args.warmup + 2 * args.window > args.duration:
+        parser.error("--duration must cover --warmup and two --window")
+
+    fakes, redis_uri, traction_url = start_fakes(args.traction_latency)
+    tmp = tempfile.TemporaryDirectory()
+    auth_path = os.path.join(tmp.name, "service-account.json")
+    endpoint = fake_service_account(auth_path, traction_url)
+
+    port = free_port()
+    server = start_controller(
+        src,
+        port,
+        redis_uri,
+        traction_url,
+        GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_MAX_REQUESTS="0",
+        GOOGLE_AUTH_JSON_PATH=auth_path,
+        PLAY_INTEGRITY_ENDPOINT=endpoint,
+    )
+    try:
+        samples, flows = [], []
+        stop = threading.Event()
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = [
+            threading.Thread(
+                target=sampler,
+                args=(server.pid, started, args.interval, stop, samples),
+            )
+        ] + [
+            threading.Thread(
+                target=client,
+                args=(f"http://127.0.0.1:{port}", redis_uri, started, deadline, flows),
+            )
+            for _ in range(args.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads[1:]:
+            thread.join()
+        stop.set()
+        threads[0].join()
+    finally:
+        server.terminate()
+        server.wait()
+        fakes.terminate()
+        tmp.cleanup()
+
+    baseline = (args.warmup, args.warmup + args.window)
+    final = (args.duration - args.window, args.duration)
+    checks = [
+        ("rss MiB", "rss", 1 / 2**20, args.max_rss_growth_mb),
+        ("fds", "fds", 1, args.max_fd_growth),
+        ("connections", "connections", 1, args.max_conn_growth),
+    ]
+
+    failures = []
+    print(f"{'':<16} {'baseline':>10} {'final':>10} {'growth':>10} {'limit':>10}")
+    for label, key, scale, limit in checks:
+        before = window_median(samples, key, *baseline)
+        after = window_median(samples, key, *final)
+        if before is None or after is None:
+            failures.append(f"no {label} samples in a window")
+            continue
+        growth = (after - before) * scale
+        print(
+            f"{label:<16} {before * scale:>10.1f} {after * scale:>10.1f} "
+            f"{growth:>+10.1f} {limit:>10}"
+        )
+        if growth > limit:
+            failures.append(f"{label} grew by {growth:.1f}, over {limit}")
+
+    p95_before = percentile(
+        [flow[1] for flow in window_flows(flows, *baseline) if flow[2]], 95
+    )
+    p95_after = percentile(
+        [flow[1] for flow in window_flows(flows, *final) if flow[2]], 95
+    )
+    drift = p95_after / p95_before if p95_before else 0.0
+    print(
+        f"{'p95 ms':<16} {p95_before * 1000:>10.1f} {p95_after * 1000:>10.1f} "
+        f"{drift:>9.2f}x {args.max_p95_drift:>9}x"
+    )
+    if not p95_before or drift > args.max_p95_drift:
+        failures.append(f"p95 latency drifted {drift:.2f}x")
+
+    errors = sum(1 for flow in flows if not flow[2])
+    error_rate = errors / len(flows) if flows else 1.0
+    print(
+        f"{len(flows)} flows, {len(flows) / args.duration:.1f}/s, "
+        f"{errors} failed ({error_rate:.2%})"
+    )
+    if error_rate > args.max_error_rate:
+        failures.append(f"error rate {error_rate:.2%} over {args.max_error_rate:.2%}")
+
+    pids = {tuple(s["workers"]) for s in samples}
+    if len(pids) > 1:
+        failures.append(f"workers were replaced: {sorted(pids)}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,48 +6,70 @@ from cryptography.hazmat.backends import default_backend
 from pyasn1.codec.der import decoder
 from pyasn1.type import univ
 from typing import List, Dict, Union
-import cbor
 import base64
+import bounded_cbor
 import hashlib
 import requests
-import os
 import logging
-from dotenv import load_dotenv
 from constants import (
-    app_id,
     rp_id_hash_end,
     counter_start,
     counter_end,
     aaguid_start,
     aaguid_end,
     cred_id_start,
+    max_attestation_object_size,
+    max_cbor_size,
+    max_cbor_items,
+    max_cbor_depth,
 )
 from cryptography.exceptions import InvalidSignature
+from resilience import guarded, timeout, DependencyError
+from apps import registry as app_registry
+import settings
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-if os.getenv("FLASK_ENV") == "development":
-    load_dotenv()
-
 AppleAppAttestStatement = Dict[str, Union[str, Dict[str, List[bytes]], bytes]]
 
+# The root CA is a long lived trust anchor, fetch it once per process.
+root_ca_cert = None
+
 
 def fetch_apple_attestation_root_ca_cert():
-    url = os.getenv("APPLE_ATTESTATION_ROOT_CA_URL")
-    response = requests.get(url)
+    global root_ca_cert
+
+    if root_ca_cert is not None:
+        return root_ca_cert
+
+    url = settings.current.apple_attestation_root_ca_url
+    response = guarded("apple", requests.get, url, timeout=timeout())
     cert_bytes = response.content
     cert = x509.load_pem_x509_certificate(cert_bytes, default_backend())
+    root_ca_cert = cert
 
     return cert
 
 
+def reset_root_ca_cert(_):
+    global root_ca_cert
+    root_ca_cert = None
+
+
+settings.on_change(("apple_attestation_root_ca_url",), reset_root_ca_cert)
+
+
 def decode_apple_attestation_object(
     object_as_base64: str,
 ) -> Union[AppleAppAttestStatement, None]:
     try:
+        if len(object_as_base64) > max_attestation_object_size:
+            raise bounded_cbor.CBORLimitError("attestation object too large")
+
         binary_data = base64.b64decode(object_as_base64)
-        return cbor.loads(binary_data)
+        return bounded_cbor.loads(
+            binary_data, max_cbor_size, max_cbor_items, max_cbor_depth
+        )
 
     except Exception as e:
         # Throws on invalid input
@@ -80,12 +102,12 @@ def verify_x5c_certificates(attestation_object):
             attestation_object["attStmt"]["x5c"][1], default_backend()
         )
 
-        logger.info(f"root_certificate: {str(root_certificate.subject)}")
-        logger.info(f"credential_certificate: {str(credential_certificate.subject)}")
-        logger.info(f"intermediate_certificate: {str(intermediate_certificate.subject)}")
+        logger.debug("root_certificate: %s", root_certificate.subject)
+        logger.debug("credential_certificate: %s", credential_certificate.subject)
+        logger.debug("intermediate_certificate: %s", intermediate_certificate.subject)
 
         if intermediate_certificate.issuer == root_certificate.subject:
-            logger.info("The child certificate was issued by the parent certificate.")
+            logger.debug("The child certificate was issued by the parent certificate.")
         else:
             logger.info(
                 "The child certificate was not issued by the parent certificate."
@@ -116,7 +138,7 @@ def verify_x5c_certificates(attestation_object):
             intermediate_certificate_is_valid is None
             and credential_certificate_is_valid is None
         ):
-            logger.info("The certificates are signed by the ROOT certificate.")
+            logger.debug("The certificates are signed by the ROOT certificate.")
             return True
 
     except InvalidSignature as e:
@@ -187,102 +209,211 @@ def create_hash_from_pub_key(cred_certificate):
     return public_key_sha256_hex
 
 
-def create_app_id_hash():
-    app_id_bytes = app_id.encode("utf-8")
-    app_id_hash = hashlib.sha256(app_id_bytes).hexdigest()
-    return app_id_hash
+def extract_credential_public_key(attestation_object):
+    certificate = x509.load_der_x509_certificate(
+        attestation_object["attStmt"]["x5c"][0], default_backend()
+    )
 
+    # 65 bytes, the X9.62 uncompressed point, is all that's needed to
+    # verify later assertions made with this key.
+    return certificate.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+
+
+def attested_app(apple_attestation_object):
+    # The app whose App ID hashes to the authData RP ID hash, if any.
+    auth_data = memoryview(apple_attestation_object["authData"])
+    return app_registry.for_rp_id_hash(auth_data[:rp_id_hash_end])
+
+
+def prepare_attestation(attestation_object, key_id):
+    """Run every check that doesn't depend on the nonce.
 
-def verify_attestation_statement(attestation_object, key_id, nonce):
+    Returns the decoded attestation object when it passes, so the nonce
+    bound checks in `verify_attestation_nonce` can be run once the nonce
+    is available, or None otherwise. The app it was made by is found with
+    `attested_app`.
+    """
     try:
         # decode the attestation object is expecting attestation_object
         # to be JSON.
-        logger.info("Decoding attestation object...")
+        logger.debug("Decoding attestation object...")
         apple_attestation_object = decode_apple_attestation_object(attestation_object)
         if not apple_attestation_object:
-            return False
+            return None
 
         # 1. Verify that the x5c array contains the intermediate and leaf
         # certificates for App Attest, starting from the credential certificate in the first
         # data buffer in the array (credcert). Verify the validity of the certificates using
         # Apple’s App Attest root certificate.
-        logger.info("Apple Attestation step 1...")
+        logger.debug("Apple Attestation step 1...")
         verify_x5c_status = verify_x5c_certificates(apple_attestation_object)
         if not verify_x5c_status:
-            return False
-
-        # 2. Create clientDataHash as the SHA256 hash of the one-time challenge your server sends
-        # to your app before performing the attestation, and append that hash to the end of the
-        # authenticator data (authData from the decoded object).
-        logger.info("Apple Attestation step 2...")
-        authdata_with_nonce_hash = create_authdata_with_nonce_hash(
-            apple_attestation_object, nonce
-        )
-
-        # 3. Generate a new SHA256 hash of the composite item to create nonce.
-        logger.info("Apple Attestation step 3...")
-        composite_nonce = create_composite_nonce(authdata_with_nonce_hash)
-
-        # 4. Obtain the value of the credCert extension with OID 1.2.840.113635.100.8.2,
-        # which is a DER-encoded ASN.1 sequence. Decode the sequence and extract the single
-        # octet string that it contains. Verify that the string equals nonce.
-        logger.info("Apple Attestation step 4...")
-        extension_value = extract_attestation_object_extension(apple_attestation_object)
-        if extension_value != composite_nonce:
-            return False
+            return None
 
         # 5. Create the SHA256 hash of the public key in credCert, and verify that it matches the
         # key identifier from your app.
-        logger.info("Apple Attestation step 5...")
+        logger.debug("Apple Attestation step 5...")
         pub_key_hash = create_hash_from_pub_key(
             apple_attestation_object["attStmt"]["x5c"][0]
         )
         key_id_b64 = base64.b64decode(key_id)
         if key_id_b64.hex() != pub_key_hash:
-            return False
+            return None
 
         # 6. Compute the SHA256 hash of your app’s App ID, and verify that it’s the same as the
         # authenticator data’s RP ID hash.
-        logger.info("Apple Attestation step 6...")
-        app_id_hash = create_app_id_hash()
-        rp_id_hash = apple_attestation_object["authData"][:rp_id_hash_end].hex()
-        if rp_id_hash != app_id_hash:
-            return False
+        # The hashes of every registered app are computed at startup, so
+        # this is a single lookup. authData fields are read through a
+        # memoryview, so none of the comparisons below copy the buffer.
+        logger.debug("Apple Attestation step 6...")
+        auth_data = memoryview(apple_attestation_object["authData"])
+        app = app_registry.for_rp_id_hash(auth_data[:rp_id_hash_end])
+        if app is None:
+            return None
 
         # 7. Verify that the authenticator data’s counter field equals 0. See
         # https://www.w3.org/TR/webauthn/#sctn-attestation for byte start and end points.
-        logger.info("Apple Attestation step 7...")
-        counter = apple_attestation_object["authData"][counter_start:counter_end]
-        if counter != bytearray(b"\x00\x00\x00\x00"):
-            return False
+        logger.debug("Apple Attestation step 7...")
+        counter = auth_data[counter_start:counter_end]
+        if counter != b"\x00\x00\x00\x00":
+            return None
 
         # 8. Verify that the authenticator data’s aaguid field is either appattestdevelop if
         # operating in the development environment, or appattest followed by seven 0x00
         # bytes if operating in the production environment.
-        logger.info("Apple Attestation step 8...")
-        aaguid = apple_attestation_object["authData"][aaguid_start:aaguid_end]
-        if aaguid != bytearray(b"appattestdevelop") and aaguid != bytearray(
-            b"appattest\x00\x00\x00\x00\x00\x00\x00"
-        ):
-            return False
+        logger.debug("Apple Attestation step 8...")
+        # Apps may accept only one of the two.
+        aaguid = auth_data[aaguid_start:aaguid_end]
+        if aaguid not in app.aaguids:
+            return None
 
         # 9. Verify that the authenticator data’s credentialId field is the same as the
         # key identifier.
-        logger.info("Apple Attestation step 9...")
+        logger.debug("Apple Attestation step 9...")
         key_identifier = base64.b64decode(key_id)
         cred_id_length = len(key_identifier)
         cred_id_end = cred_id_start + cred_id_length
-        credential_id = apple_attestation_object["authData"][cred_id_start:cred_id_end]
+        credential_id = auth_data[cred_id_start:cred_id_end]
         if credential_id != key_identifier:
+            return None
+
+        return apple_attestation_object
+
+    except DependencyError:
+        raise
+    except Exception as e:
+        logger.error("Error during Apple attestation: %s", e)
+        return None
+
+
+def verify_attestation_nonce(apple_attestation_object, nonce):
+    try:
+        # 2. Create clientDataHash as the SHA256 hash of the one-time challenge your server sends
+        # to your app before performing the attestation, and append that hash to the end of the
+        # authenticator data (authData from the decoded object).
+        logger.debug("Apple Attestation step 2...")
+        authdata_with_nonce_hash = create_authdata_with_nonce_hash(
+            apple_attestation_object, nonce
+        )
+
+        # 3. Generate a new SHA256 hash of the composite item to create nonce.
+        logger.debug("Apple Attestation step 3...")
+        composite_nonce = create_composite_nonce(authdata_with_nonce_hash)
+
+        # 4. Obtain the value of the credCert extension with OID 1.2.840.113635.100.8.2,
+        # which is a DER-encoded ASN.1 sequence. Decode the sequence and extract the single
+        # octet string that it contains. Verify that the string equals nonce.
+        logger.debug("Apple Attestation step 4...")
+        extension_value = extract_attestation_object_extension(apple_attestation_object)
+        if extension_value != composite_nonce:
             return False
 
         logger.info("Successful apple attestation")
         return True
 
     except Exception as e:
-        logger.error(f"Error during Apple attestation: {e}")
+        logger.error("Error during Apple attestation: %s", e)
+        return False
+
+
+def verify_attestation_statement(attestation_object, key_id, nonce, app=None):
+    apple_attestation_object = prepare_attestation(attestation_object, key_id)
+    if apple_attestation_object is None:
+        return False
+    if attested_app(apple_attestation_object) is not (app or app_registry.default):
         return False
 
+    return verify_attestation_nonce(apple_attestation_object, nonce)
+
+
+def verify_assertion(assertion_object, public_key_bytes, counter, nonce, app):
+    """Verify an App Attest assertion made with a previously attested key.
+
+    `app` is the app the key was attested for.
+
+    Returns the assertion's sign counter when the assertion is valid, or
+    None otherwise. The caller is responsible for storing the counter.
+    """
+    try:
+        logger.debug("Decoding assertion object...")
+        assertion = decode_apple_attestation_object(assertion_object)
+        if not assertion:
+            return None
+
+        authenticator_data = assertion["authenticatorData"]
+        auth_data = memoryview(authenticator_data)
+
+        # 1. Compute clientDataHash as the SHA256 hash of clientData, the
+        # one-time challenge your server sent to your app.
+        logger.debug("Apple Assertion step 1...")
+        client_data_hash = hashlib.sha256(nonce.encode("utf-8")).digest()
+
+        # 2. Concatenate authenticatorData and clientDataHash, and apply a SHA256
+        # hash over the result to form nonce.
+        logger.debug("Apple Assertion step 2...")
+        # Hashed in two parts rather than concatenated, which would copy it.
+        composite = hashlib.sha256(auth_data)
+        composite.update(client_data_hash)
+        composite_nonce = composite.digest()
+
+        # 3. Use the public key that you store from the attestation object to
+        # verify that the assertion’s signature is valid for nonce.
+        logger.debug("Apple Assertion step 3...")
+        public_key = ec.EllipticCurvePublicKey.from_encoded_point(
+            ec.SECP256R1(), public_key_bytes
+        )
+        public_key.verify(
+            assertion["signature"], composite_nonce, ec.ECDSA(hashes.SHA256())
+        )
+
+        # 4. Compute the SHA256 hash of the client’s App ID, and verify that it
+        # matches the RP ID in the authenticator data.
+        logger.debug("Apple Assertion step 4...")
+        if auth_data[:rp_id_hash_end] != app.rp_id_hash:
+            return None
+
+        # 5. Verify that the authenticator data’s counter value is greater than
+        # the value from the previous assertion, or greater than 0 on the first
+        # assertion.
+        logger.debug("Apple Assertion step 5...")
+        assertion_counter = int.from_bytes(
+            auth_data[counter_start:counter_end], byteorder="big"
+        )
+        if assertion_counter <= counter:
+            return None
+
+        logger.info("Successful apple assertion")
+        return assertion_counter
+
+    except InvalidSignature:
+        logger.info("The assertion is NOT signed by the attested key.")
+        return None
+    except Exception as e:
+        logger.error("Error during Apple assertion: %s", e)
+        return None
+
 
 def main():
     pass
@@ -0,0 +1,153 @@
+"""Registry of the wallet apps this controller attests.
+
+Each app's policy is resolved once at startup, including the SHA256 of
+its Apple App ID, which is the RP ID hash found in App Attest
+authenticator data. Attestations are then matched to an app with a single
+dictionary lookup on that hash, or on the Android package name, however
+many apps are registered.
+
+Apps are read from the JSON file in APPS_PATH, for example:
+
+    {
+        "apps": [
+            {
+                "name": "bc_wallet",
+                "vendor": "Government of British Columbia",
+                "apple_app_id": "L796QSLV3E.ca.bc.gov.BCWallet",
+                "android_package": "ca.bc.gov.BCWallet",
+                "aaguids": ["production", "development"],
+                "cred_def_tag": null,
+                "allow_test_builds": false,
+                "verdict_policy": {"min_version_code": 1200}
+            }
+        ]
+    }
+
+Without APPS_PATH the registry holds the BC Wallet app from constants.
+The first app listed is the default for requests that don't name one.
+"""
+
+import os
+import hashlib
+import logging
+import codec
+import settings
+from constants import (
+    app_id,
+    app_vendor,
+    bc_wallet_package_name,
+    production_aaguid,
+    development_aaguid,
+)
+
+logger = logging.getLogger(__name__)
+
+aaguids = {"production": production_aaguid, "development": development_aaguid}
+
+
+class App:
+    __slots__ = (
+        "name",
+        "vendor",
+        "apple_app_id",
+        "android_package",
+        "bundle_id",
+        "rp_id_hash",
+        "aaguids",
+        "cred_def_tag",
+        "test_builds",
+        "verdict_policy",
+    )
+
+    def __init__(self, config):
+        self.name = config["name"]
+        self.vendor = config["vendor"]
+        self.apple_app_id = config.get("apple_app_id")
+        self.android_package = config.get("android_package")
+        if not self.apple_app_id and not self.android_package:
+            raise ValueError(f"app {self.name} has neither an App ID nor a package")
+
+        # The App ID without its team ID prefix, issued as the app_id
+        # attribute of the credential.
+        if self.apple_app_id:
+            self.bundle_id = self.apple_app_id.split(".", 1)[1]
+            self.rp_id_hash = hashlib.sha256(self.apple_app_id.encode()).digest()
+        else:
+            self.bundle_id = self.android_package
+            self.rp_id_hash = None
+
+        self.aaguids = frozenset(
+            aaguids[name] for name in config.get("aaguids", aaguids)
+        )
+        self.cred_def_tag = config.get("cred_def_tag")
+        # None follows ALLOW_TEST_BUILDS, which can change on reload.
+        self.test_builds = config.get("allow_test_builds")
+        # Overrides of the Play Integrity verdict policy, see verdict_policy.py
+        self.verdict_policy = config.get("verdict_policy", {})
+
+    @property
+    def allow_test_builds(self):
+        if self.test_builds is None:
+            return settings.current.allow_test_builds
+        return self.test_builds
+
+
+def default_config():
+    return {
+        "apps": [
+            {
+                "name": "bc_wallet",
+                "vendor": app_vendor,
+                "apple_app_id": app_id,
+                "android_package": bc_wallet_package_name,
+            }
+        ]
+    }
+
+
+class AppRegistry:
+    def __init__(self, config):
+        self.by_name = {}
+        self.by_rp_id_hash = {}
+        self.by_package = {}
+        self.by_bundle_id = {}
+
+        for app in (App(entry) for entry in config["apps"]):
+            if app.name in self.by_name:
+                raise ValueError(f"app {app.name} is listed twice")
+            self.by_name[app.name] = app
+            self.by_bundle_id[app.bundle_id] = app
+            if app.rp_id_hash is not None:
+                self.by_rp_id_hash[app.rp_id_hash] = app
+            if app.android_package is not None:
+                self.by_package[app.android_package] = app
+
+        self.default = next(iter(self.by_name.values()))
+
+    def for_rp_id_hash(self, rp_id_hash):
+        # Also takes a read-only memoryview, which hashes and compares
+        # like the bytes it is over.
+        return self.by_rp_id_hash.get(rp_id_hash)
+
+    def for_package(self, package_name):
+        return self.by_package.get(package_name)
+
+    def for_request(self, requested):
+        # Requests may name their app by bundle ID or package name.
+        if requested is None:
+            return self.default
+        return self.by_bundle_id.get(requested) or self.by_package.get(requested)
+
+    def for_name(self, name):
+        return self.by_name.get(name)
+
+
+def load():
+    path = os.getenv("APPS_PATH")
+    config = codec.load_file(path) if path else default_config()
+    registry = AppRegistry(config)
+    logger.info("Loaded %s apps", len(registry.by_name))
+    return registry
+
+
+registry = load()
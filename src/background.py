@@ -0,0 +1,46 @@
+"""Per-process setup of background threads.
+
+Threads don't survive into forked gunicorn workers, so each process
+starts its own: lazily, and again in a worker after the fork.
+"""
+
+import os
+import threading
+
+# Name of each thing set up, and the pid of the process it was set up in.
+_pids = {}
+_lock = threading.RLock()
+
+
+def once_per_process(name, setup):
+    """Call `setup()` once in each process, returning whether it ran."""
+    pid = os.getpid()
+    if _pids.get(name) == pid:
+        return False
+    with _lock:
+        if _pids.get(name) == pid:
+            return False
+        setup()
+        _pids[name] = pid
+        return True
+
+
+def start_once(name, target):
+    """Start a daemon thread named `name` running `target`, once per process."""
+    return once_per_process(
+        name,
+        lambda: threading.Thread(target=target, name=name, daemon=True).start(),
+    )
+
+
+def running(name):
+    return _pids.get(name) == os.getpid()
+
+
+def _reset_lock():
+    # The lock may have been held by another thread at the fork.
+    global _lock
+    _lock = threading.RLock()
+
+
+os.register_at_fork(after_in_child=_reset_lock)
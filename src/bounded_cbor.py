@@ -0,0 +1,81 @@
+"""CBOR decoding with limits on size, item count and nesting.
+
+The input is first walked header by header, without building any
+objects, so hostile or truncated input is rejected before the decoder
+allocates anything. Only input that passes is handed to the C decoder.
+"""
+
+import struct
+
+# cbor2 is maintained and ships a C decoder, `cbor` is the fallback.
+try:
+    from cbor2 import loads as _loads
+except ImportError:
+    from cbor import loads as _loads
+
+
+class CBORLimitError(ValueError):
+    pass
+
+
+# Big endian readers for 1, 2, 4 and 8 byte header arguments.
+_readers = [struct.Struct(fmt).unpack_from for fmt in (">B", ">H", ">I", ">Q")]
+
+
+def scan(data, max_items, max_depth):
+    size = len(data)
+    offset = 0
+    items = 0
+    # Number of items still expected at each open nesting level.
+    pending = [1]
+
+    try:
+        while pending:
+            if pending[-1] == 0:
+                pending.pop()
+                continue
+            pending[-1] -= 1
+
+            items += 1
+            if items > max_items:
+                raise CBORLimitError(f"more than {max_items} items")
+
+            initial = data[offset]
+            major, info = initial >> 5, initial & 0x1F
+            offset += 1
+            if info < 24:
+                value = info
+            elif info < 28:
+                (value,) = _readers[info - 24](data, offset)
+                offset += 1 << (info - 24)
+            else:
+                # 28-30 are reserved, 31 is indefinite length which App
+                # Attest never uses.
+                raise CBORLimitError(f"unsupported additional info {info}")
+
+            if major == 2 or major == 3:
+                offset += value
+                if offset > size:
+                    raise CBORLimitError("truncated string")
+            elif major >= 4 and major <= 6:
+                # Arrays hold `value` items, maps twice that, tags one.
+                children = value * 2 if major == 5 else 1 if major == 6 else value
+                if children > max_items:
+                    raise CBORLimitError(f"more than {max_items} items")
+                pending.append(children)
+                if len(pending) > max_depth + 1:
+                    raise CBORLimitError(f"nested deeper than {max_depth}")
+    except (IndexError, struct.error):
+        raise CBORLimitError("truncated input")
+
+    if offset != size:
+        raise CBORLimitError("trailing data")
+
+
+def loads(data, max_size, max_items, max_depth):
+    if len(data) > max_size:
+        raise CBORLimitError(f"larger than {max_size} bytes")
+
+    scan(data, max_items, max_depth)
+
+    return _loads(data)
@@ -0,0 +1,40 @@
+import functools
+
+# orjson is several times faster than the standard library for both
+# directions, and works on bytes without decoding them to str first.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+
+if orjson is not None:
+    DecodeError = orjson.JSONDecodeError
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+
+else:
+    DecodeError = json.JSONDecodeError
+
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+@functools.lru_cache(maxsize=32)
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def load_file(path):
+    # The file is read once, each call parses a fresh copy that the
+    # caller is free to modify.
+    return loads(read_file(path))
@@ -6,6 +6,7 @@ class AttestationMethod(Enum):
     GooglePlayIntegrity = "google:play-integrity"
 
 
+# BC Wallet, the default app when APPS_PATH doesn't list any, see apps.py
 app_vendor = "Government of British Columbia"
 
 # Apple App Attestation
@@ -16,18 +17,121 @@ counter_end = 37
 aaguid_start = 37
 aaguid_end = 53
 cred_id_start = 55
+production_aaguid = b"appattest\x00\x00\x00\x00\x00\x00\x00"
+development_aaguid = b"appattestdevelop"
 
 # Google Play Integrity
 integrity_scope = "https://www.googleapis.com/auth/playintegrity"
 bc_wallet_package_name = "ca.bc.gov.BCWallet"
 PLAY_RECOGNIZED = "PLAY_RECOGNIZED"
+# The verdict policy every app starts from, see verdict_policy.py
+default_verdict_policy = {
+    "device_verdicts": ["MEETS_DEVICE_INTEGRITY"],  # all required
+    "app_verdicts": [PLAY_RECOGNIZED],  # any, unless test builds are allowed
+    "min_version_code": None,
+    "certificate_digests": None,  # any of these signing certificates
+    "licensing_verdicts": None,  # any
+    "max_age_seconds": None,  # since the integrity token was requested
+}
+# Decoded verdicts are cached for as long as their nonce can be used.
+verdict_cache_size = 1024  # verdicts kept per worker
+verdict_cache_ttl = 60 * 10  # seconds, the same as auto_expire_nonce
+verdict_key_prefix = "verdict:"  # followed by the SHA-256 of the token
 
 # Redis
 auto_expire_nonce = 60 * 10  # 10 minutes
 
-# Attestation cred def IDs
+# Attestation cred def IDs, the seed for the cred def registry until
+# discovery from Traction succeeds.
 attestation_cred_def_ids = [
     "NXp6XcGeCR2MviWuY51Dva:3:CL:33557:bcwallet_dev_v2",
     "RycQpZ9b4NaXuT5ZGjXkUE:3:CL:120:bcwallet_test_v2",
     "XqaRXJt4sXE6TRpfGpVbGw:3:CL:655:bcwallet",
 ]
+
+# Resilience, all values in seconds unless noted
+request_deadline = 30  # budget for a single inbound webhook
+dependency_timeout = 10  # cap for any single outbound call
+breaker_failure_threshold = 5  # consecutive failures before the breaker trips
+breaker_slow_call_threshold = 5  # calls slower than this count as failures
+breaker_reset_timeout = 30  # how long a tripped breaker stays open
+
+# Bulkheads, one bounded pool per platform / dependency
+apple_pool_workers = 2  # Apple verification is CPU bound
+apple_pool_queue = 8
+google_pool_workers = 8  # Google verification waits on the Play Integrity API
+google_pool_queue = 16
+traction_pool_workers = 8
+traction_pool_queue = 32
+redis_pool_workers = 8  # used to overlap Redis round trips with verification
+redis_pool_queue = 32
+batch_pool_workers = 8  # runs the calls of a JSON-RPC batch side by side
+batch_pool_queue = 32
+
+# JSON-RPC batches
+max_drpc_batch = 10  # calls accepted in one batch
+# Calls that replace the connection's nonce. They run after the rest of
+# a batch, which may still need the nonce they replace.
+nonce_issuing_methods = {"request_nonce", "request_nonce_v2"}
+
+# App Attest assertions
+assertion_key_prefix = "assertion:"
+assertion_key_ttl = 60 * 60 * 24 * 30  # 30 days since the last use
+
+# Payload limits, in bytes
+max_webhook_size = 64 * 1024
+max_attestation_object_size = 16 * 1024
+
+# Attestation object decoding limits
+max_cbor_size = 12 * 1024  # decoded bytes
+max_cbor_items = 32
+max_cbor_depth = 4
+
+# DRPC traffic recorder
+record_queue_size = 10000  # records waiting to be written
+record_max_bytes = 50 * 1024 * 1024  # rotate after this many bytes
+record_backups = 5  # rotated files kept per worker
+redacted_fields = {
+    "nonce",
+    "attestation_object",
+    "assertion_object",
+    "key_id",
+    "token",
+    "integrityToken",
+}
+
+# Attestation outcome events, see outcomes.py
+outcome_queue_size = 10000  # events waiting to be flushed
+outcome_batch_size = 200  # events flushed together
+outcome_flush_interval = 1  # seconds an event waits for its batch to fill
+outcome_stream_maxlen = 1000000  # approximate entries kept in the stream
+outcome_max_bytes = 20 * 1024 * 1024  # rotate the file after this many bytes
+outcome_backups = 5  # rotated files kept per worker
+
+# Offer lifecycle, see offers.py
+offer_key_prefix = "offer:"  # followed by the connection ID
+pending_offers_key = "offers:pending"  # sorted set of offers not yet issued
+offer_ttl = 60 * 60 * 24  # seconds an offer is tracked
+offer_stuck_after = 5 * 60  # seconds without a credential before it's stuck
+offer_scan_interval = 30  # seconds between counts of stuck offers
+
+# Settings, see settings.py
+settings_poll_interval = 5  # seconds between checks for changed files
+
+# Health checks
+health_refresh_interval = 10  # seconds between background probes
+health_stale_after = 30  # probe results older than this count as failed
+readiness_required = ("redis", "traction")  # needed by every DRPC method
+
+# Memory profiling, see profiling.py
+# Frames kept per traced allocation. Each frame makes tracing slower,
+# importing the Apple module takes 1s traced with 1 frame and 10s with 10.
+profiling_frames = 1
+profiling_snapshot_every = 50  # runs of a stage between snapshot pairs
+profiling_top_lines = 10  # allocating lines kept per stage
+
+# Credential definition discovery, see cred_defs.py
+attestation_schema_name = "app_attestation"
+attestation_schema_version = "1.0"
+cred_def_ttl = 5 * 60  # seconds before the discovered set is refreshed
+cred_def_retry = 30  # seconds between refreshes after a failed one
@@ -1,35 +1,75 @@
-import json
+import hmac
+import base64
 import secrets
+import tempfile
 import logging
 import random
-from flask import Flask, request, make_response
+from flask import Flask, request, make_response, jsonify, abort, g
 from traction import (
     send_drpc_response,
     send_drpc_request,
     offer_attestation_credential,
+    has_bearer_token,
+    fetch_bearer_token,
 )
-from apple import verify_attestation_statement
-from goog import verify_integrity_token
 import os
-from dotenv import load_dotenv
+import settings
 from redis_config import redis_instance
+from redis_scripts import update_assertion_counter_script
 from constants import (
     auto_expire_nonce,
-    app_id,
-    app_vendor,
     AttestationMethod,
-    attestation_cred_def_ids,
+    request_deadline,
+    assertion_key_prefix,
+    assertion_key_ttl,
+    max_webhook_size,
+    max_attestation_object_size,
+    max_drpc_batch,
+    nonce_issuing_methods,
 )
+from resilience import guarded, deadline, breaker_states, DependencyError
+from executors import (
+    apple_pool,
+    google_pool,
+    traction_pool,
+    redis_pool,
+    batch_pool,
+    pool_saturation,
+    wait,
+    PoolSaturated,
+)
+from lazy import lazy_import
+import codec
+from warmup import warm_up_enabled, warm_imports
+from recorder import record
+from cred_defs import registry as cred_def_registry
+from apps import registry as app_registry
+from log_setup import configure_logging, bind, add_fields
+import profiling
+from profiling import stage, run_stage, collect_timings
+import outcomes
+import offers
+import health
+from health import readiness
+import metrics
+from metrics import drpc_inflight, worker_busy, pending_offers
 from datetime import datetime
 
-if os.getenv("FLASK_ENV") == "development":
-    load_dotenv()
+configure_logging()
+profiling.start()
 
 server = Flask(__name__)
-logging.basicConfig(level=logging.INFO)
+# Oversized webhooks are rejected with a 413 before the body is read.
+server.config["MAX_CONTENT_LENGTH"] = max_webhook_size
 logger = logging.getLogger(__name__)
 
+# Platform modules pull in heavy dependencies, they are loaded on first
+# use or by the warm-up stage.
+apple = lazy_import("apple")
+goog = lazy_import("goog")
+
 error_codes = {
+    32600: "invalid request",
     32601: "method not found",
     32602: "invalid params",
     32603: "nonce not found",
@@ -37,23 +77,100 @@ error_codes = {
     32605: "unsupported platform",
     32606: "invalid challenge",
     32607: "unable to cache nonce",
+    32608: "dependency unavailable",
+    32609: "server busy",
+    32610: "assertion key not found",
+    32611: "unknown app",
 }
 
 
 def handle_drpc_request(drpc_request, connection_id):
-    handler = {
-        "request_nonce": handle_drpc_request_nonce_v1,
-        "request_nonce_v2": handle_drpc_request_nonce_v2,
-        "request_attestation_v2": handle_drpc_request_attestation_v2,
-    }.get(drpc_request["method"], handle_drpc_default)
+    handler = drpc_request_handlers.get(drpc_request["method"], handle_drpc_default)
 
     return handler(drpc_request, connection_id)
 
 
+def run_drpc_call(drpc_request, connection_id):
+    method = drpc_request.get("method")
+    # Unknown methods share a label, so callers can't add time series.
+    label = method if method in drpc_request_handlers else "unknown"
+
+    with drpc_inflight.labels(label).track_inprogress():
+        with stage(f"method:{label}", request=True):
+            return handle_drpc_request(drpc_request, connection_id)
+
+
+def run_drpc_calls(drpc_requests, connection_id):
+    # The first call runs on the request thread, the rest on the batch
+    # pool. If the pool is full they run here one after the other.
+    futures = []
+    for drpc_request in drpc_requests[1:]:
+        try:
+            futures.append(
+                batch_pool.submit(run_drpc_call, drpc_request, connection_id)
+            )
+        except PoolSaturated:
+            futures.append(None)
+
+    responses = [run_drpc_call(drpc_requests[0], connection_id)]
+    for drpc_request, future in zip(drpc_requests[1:], futures):
+        if future is None:
+            responses.append(run_drpc_call(drpc_request, connection_id))
+            continue
+        try:
+            responses.append(wait(future))
+        except DependencyError as e:
+            logger.info("Batch call ran out of time: %s", e)
+            responses.append(report_failure(drpc_request.get("id"), 32608))
+
+    return responses
+
+
+def handle_drpc_batch(drpc_requests, connection_id):
+    """Handle a JSON-RPC 2.0 batch, returning one list of responses.
+
+    Calls run concurrently, except those replacing the connection's nonce,
+    which run once the others are done. Responses keep the order of the
+    calls. Notifications, calls without an id, are run but not answered,
+    and neither are calls answered with an empty response.
+    """
+    if not drpc_requests or len(drpc_requests) > max_drpc_batch:
+        logger.info("Rejecting batch of %s calls", len(drpc_requests))
+        return report_failure(None, 32600)
+
+    responses = [None] * len(drpc_requests)
+    calls = []
+    nonce_calls = []
+    notifications = set()
+    for index, drpc_request in enumerate(drpc_requests):
+        if not isinstance(drpc_request, dict) or "method" not in drpc_request:
+            responses[index] = report_failure(None, 32600)
+            continue
+        if "id" not in drpc_request:
+            notifications.add(index)
+        if drpc_request["method"] in nonce_issuing_methods:
+            nonce_calls.append(index)
+        else:
+            calls.append(index)
+
+    if calls:
+        results = run_drpc_calls([drpc_requests[i] for i in calls], connection_id)
+        for index, response in zip(calls, results):
+            responses[index] = response
+    for index in nonce_calls:
+        responses[index] = run_drpc_call(drpc_requests[index], connection_id)
+
+    return [
+        response
+        for index, response in enumerate(responses)
+        if response and index not in notifications
+    ]
+
+
 def handle_drpc_response(drpc_response, connection_id):
-    handler = {
-        "request_attestation_v1": handle_drpc_request_attestation_v1,
-    }.get(drpc_response["request"]["method"], handle_drpc_default)
+    handler = drpc_response_handlers.get(
+        drpc_response["request"]["method"], handle_drpc_default
+    )
 
     return handler(drpc_response, connection_id)
 
@@ -82,11 +199,11 @@ def handle_drpc_request_nonce_v1(drpc_request, connection_id):
 
     # Cache nonce with connection id as key, allow it to expire
     # after `auto_expire_nonce` seconds
-    redis_instance.setex(connection_id, auto_expire_nonce, nonce)
+    guarded("redis", redis_instance.setex, connection_id, auto_expire_nonce, nonce)
 
     # The response to a request for a nonce is a request for
     # attestation. This is fixed in v2 of the protocol.
-    send_drpc_request(connection_id, request_attestation)
+    traction_pool.run(send_drpc_request, connection_id, request_attestation)
 
     return {}  # return empty response
 
@@ -100,9 +217,12 @@ def handle_drpc_request_nonce_v2(drpc_request, connection_id):
 
         # Cache nonce with connection id as key, allow it to expire
         # after `auto_expire_nonce` seconds
-        redis_instance.setex(connection_id, auto_expire_nonce, nonce)
+        guarded("redis", redis_instance.setex, connection_id, auto_expire_nonce, nonce)
+    except DependencyError as e:
+        logger.info("Redis unavailable for connection id: %s, %s", connection_id, e)
+        return report_failure(drpc_request_id, 32608)
     except Exception as e:
-        logger.info(f"Unable to cache nonce for connection id: {connection_id}, {e}")
+        logger.info("Unable to cache nonce for connection id: %s, %s", connection_id, e)
         return report_failure(drpc_request_id, 32607)
 
     response = {
@@ -128,7 +248,7 @@ def handle_drpc_request_attestation_v1(drpc_response, connection_id):
     key_id = result.get("key_id", None)
 
     # fetch nonce from cache using connection id as key
-    nonce = redis_instance.get(connection_id)
+    nonce = guarded("redis", redis_instance.get, connection_id)
     if not nonce:
         logger.info("No cached nonce")
 
@@ -140,8 +260,13 @@ def handle_drpc_request_attestation_v1(drpc_response, connection_id):
         logger.info("Key id missing for apple attestation")
         # TODO(jl): Fail gracefully
 
+    if attestation_object and len(attestation_object) > max_attestation_object_size:
+        logger.info("Attestation object too large")
+        return
+
+    timings = collect_timings()
     try:
-        return validate_and_offer(
+        rv = validate_and_offer(
             (attestation_object, key_id),
             nonce,
             platform,
@@ -150,7 +275,13 @@ def handle_drpc_request_attestation_v1(drpc_response, connection_id):
             connection_id,
         )
     except Exception as e:
-        logger.info(f"Error processing attestation {str(e)}")
+        logger.info("Error processing attestation %s", e)
+        rv = 32606
+
+    outcomes.emit(
+        "request_attestation_v1", platform, app_version, os_version, rv, timings
+    )
+    return rv
 
 
 def handle_drpc_request_attestation_v2(drpc_request, connection_id):
@@ -169,13 +300,17 @@ def handle_drpc_request_attestation_v2(drpc_request, connection_id):
     key_id = attestation_params.get("key_id", None)
     drpc_request_id = drpc_request.get("id", random.randint(0, 1000000))
 
-    # fetch nonce from cache using connection id as key
-    nonce = redis_instance.get(connection_id)
-    if not nonce:
-        logger.info("No cached nonce")
-        return report_failure(drpc_request_id, 32603)
-
-    if None in [attestation_object, nonce, platform, app_version, os_version]:
+    # Selects the Play Integrity package. Apps attested through Apple are
+    # identified by the RP ID hash in their attestation, so app_id is
+    # ignored for them.
+    app = None
+    if platform == "google":
+        app = app_registry.for_request(attestation_params.get("app_id"))
+        if app is None:
+            logger.info("Unknown app %s", attestation_params.get("app_id"))
+            return report_failure(drpc_request_id, 32611)
+
+    if None in [attestation_object, platform, app_version, os_version]:
         logger.info("Attestation paremeters missing")
         return report_failure(drpc_request_id, 32602)
 
@@ -183,15 +318,71 @@ def handle_drpc_request_attestation_v2(drpc_request, connection_id):
         logger.info("Key id missing for apple attestation")
         return report_failure(drpc_request_id, 32602)
 
+    if len(attestation_object) > max_attestation_object_size:
+        logger.info("Attestation object too large")
+        return report_failure(drpc_request_id, 32602)
+
+    timings = collect_timings()
     try:
-        rv = validate_and_offer(
+        rv = pipelined_validate_and_offer(
             (attestation_object, key_id),
-            nonce,
+            app,
             platform,
             app_version,
             os_version,
             connection_id,
         )
+    except DependencyError as e:
+        logger.info("Dependency unavailable processing attestation: %s", e)
+        rv = 32608
+    except PoolSaturated as e:
+        logger.info("Unable to process attestation: %s", e)
+        rv = 32609
+    except Exception as e:
+        logger.info("Error processing attestation: %s", e)
+        rv = 32606
+
+    outcomes.emit(
+        "request_attestation_v2", platform, app_version, os_version, rv, timings
+    )
+    if rv is not None:
+        return report_failure(drpc_request_id, rv)
+
+    response = {
+        "jsonrpc": "2.0",
+        "result": {"status": "success"},
+        "id": drpc_request_id,
+    }
+
+    return response
+
+
+def handle_drpc_request_assertion(drpc_request, connection_id):
+    logger.info("handle_drpc_request_assertion")
+
+    assertion_params = drpc_request.get("params")
+    drpc_request_id = drpc_request.get("id", random.randint(0, 1000000))
+
+    if not assertion_params:
+        return report_failure(drpc_request_id, 32602)
+
+    assertion_object = assertion_params.get("assertion_object")
+    key_id = assertion_params.get("key_id")
+    app_version = assertion_params.get("app_version")
+    os_version = assertion_params.get("os_version")
+
+    if None in [assertion_object, key_id, app_version, os_version]:
+        logger.info("Assertion paremeters missing")
+        return report_failure(drpc_request_id, 32602)
+
+    if len(assertion_object) > max_attestation_object_size:
+        logger.info("Assertion object too large")
+        return report_failure(drpc_request_id, 32602)
+
+    try:
+        rv = validate_assertion_and_offer(
+            (assertion_object, key_id), app_version, os_version, connection_id
+        )
 
         if rv is not None:
             return report_failure(drpc_request_id, rv)
@@ -204,39 +395,88 @@ def handle_drpc_request_attestation_v2(drpc_request, connection_id):
 
         return response
 
+    except DependencyError as e:
+        logger.info("Dependency unavailable processing assertion: %s", e)
+        return report_failure(drpc_request_id, 32608)
+    except PoolSaturated as e:
+        logger.info("Unable to process assertion: %s", e)
+        return report_failure(drpc_request_id, 32609)
     except Exception as e:
-        logger.info(f"Error processing attestation: {e}")
+        logger.info("Error processing assertion: %s", e)
         return report_failure(drpc_request_id, 32606)
 
 
-# TODO(jl): Break into seporate validate and offer functions.
-def validate_and_offer(
-    attestation_data, nonce, platform, app_version, os_version, connection_id
-):
-    attestation_object, key_id = attestation_data
+drpc_request_handlers = {
+    "request_nonce": handle_drpc_request_nonce_v1,
+    "request_nonce_v2": handle_drpc_request_nonce_v2,
+    "request_attestation_v2": handle_drpc_request_attestation_v2,
+    "request_assertion": handle_drpc_request_assertion,
+}
+
+drpc_response_handlers = {
+    "request_attestation_v1": handle_drpc_request_attestation_v1,
+}
+
+
+def prefetch_bearer_token():
+    # A missing or expired Traction token is fetched while the attestation
+    # is verified, rather than by send_offer once it has been.
+    if has_bearer_token():
+        return None
+    try:
+        return traction_pool.submit(fetch_bearer_token)
+    except PoolSaturated:
+        return None
+
+
+def cancel_prefetch(future):
+    if future is not None:
+        traction_pool.cancel(future)
+
+
+def join_prefetch(future):
+    # send_offer fetches the token itself if the prefetch failed.
+    if future is None:
+        return
+    try:
+        wait(future)
+    except Exception as e:
+        logger.info("Unable to prefetch the Traction token: %s", e)
+
+
+def send_offer(offer):
+    with pending_offers.track_inprogress():
+        traction_pool.run(
+            run_stage, "traction.send_offer", offer_attestation_credential, offer
+        )
+
+
+def reload_templates(_):
+    # Template files are cached once read.
+    codec.read_file.cache_clear()
+
+
+settings.on_change(("message_templates_path",), reload_templates)
+
+
+def build_offer(platform, app, app_version, os_version, connection_id):
     os_version_parts = os_version.split(" ")
     method = (
         AttestationMethod.AppleAppAttestation.value
         if platform == "apple"
         else AttestationMethod.GooglePlayIntegrity.value
     )
-    is_valid_challenge = False
-
-    message_templates_path = os.getenv("MESSAGE_TEMPLATES_PATH")
-    with open(os.path.join(message_templates_path, "offer.json"), "r") as f:
-        offer = json.load(f)
 
-    did = os.getenv("TRACTION_LEGACY_DID")
+    message_templates_path = settings.current.message_templates_path
+    offer = codec.load_file(os.path.join(message_templates_path, "offer.json"))
 
-    def pred(cred_def):
-        return did in cred_def
-
-    # find the cred def id that contains the current
-    # traction issuer did
-    cred_def_id = next(filter(pred, attestation_cred_def_ids), None)
+    # find the cred def id of the current traction issuer did
+    cred_def_id = cred_def_registry.lookup(
+        settings.current.traction_legacy_did, app.cred_def_tag
+    )
     if cred_def_id is None:
         logger.info("No matching cred def id")
-        return 32604
+        return None
 
     offer["cred_def_id"] = cred_def_id
     offer["connection_id"] = connection_id
@@ -244,27 +484,55 @@ def validate_and_offer(
         {"name": "operating_system", "value": os_version_parts[0]},
         {"name": "operating_system_version", "value": os_version_parts[1]},
         {"name": "validation_method", "value": method},
-        {"name": "app_id", "value": ".".join(app_id.split(".")[1:])},
-        {"name": "app_vendor", "value": app_vendor},
+        {"name": "app_id", "value": app.bundle_id},
+        {"name": "app_vendor", "value": app.vendor},
         {"name": "issue_date_dateint", "value": datetime.now().strftime("%Y%m%d")},
         {"name": "app_version", "value": app_version},
     ]
 
+    return offer
+
+
+def validate_and_offer(
+    attestation_data, nonce, platform, app_version, os_version, connection_id
+):
+    attestation_object, key_id = attestation_data
+    is_valid_challenge = False
+
+    # v1 predates the app registry and only attests the default app.
+    app = app_registry.default
+    offer = build_offer(platform, app, app_version, os_version, connection_id)
+    if offer is None:
+        return 32604
+
     if platform == "apple":
         logger.info("testing apple challenge")
-        is_valid_challenge = verify_attestation_statement(
-            attestation_object, key_id, nonce
+        is_valid_challenge = apple_pool.run(
+            run_stage,
+            "apple.verify_attestation_statement",
+            apple.verify_attestation_statement,
+            attestation_object,
+            key_id,
+            nonce,
+            app,
         )
     elif platform == "google":
         logger.info("testing google challenge")
-        is_valid_challenge = verify_integrity_token(attestation_object, nonce)
+        is_valid_challenge = google_pool.run(
+            run_stage,
+            "google.verify_integrity_token",
+            goog.verify_integrity_token,
+            attestation_object,
+            nonce,
+            app,
+        )
     else:
         logger.info("unsupported platform")
         return 32605
 
     if is_valid_challenge:
         logger.info("valid challenge")
-        offer_attestation_credential(offer)
+        send_offer(offer)
     else:
         logger.info("invalid challenge")
         return 32606
@@ -272,6 +540,182 @@ def validate_and_offer(
     return None
 
 
+def store_assertion_key(key_id, public_key, app):
+    # The sign counter of a freshly attested key is 0. Stored as
+    # "<counter>:<public key>:<app>" to keep one small string per key.
+    value = f"0:{base64.b64encode(public_key).decode('ascii')}:{app.name}"
+    try:
+        guarded(
+            "redis",
+            redis_instance.setex,
+            f"{assertion_key_prefix}{key_id}",
+            assertion_key_ttl,
+            value,
+        )
+    except Exception as e:
+        # The wallet can still re-attest, so this doesn't fail the request.
+        logger.info("Unable to store assertion key for %s: %s", key_id, e)
+
+
+def validate_assertion_and_offer(
+    assertion_data, app_version, os_version, connection_id
+):
+    assertion_object, key_id = assertion_data
+    assertion_key = f"{assertion_key_prefix}{key_id}"
+
+    nonce_future = redis_pool.submit(
+        guarded, "redis", redis_instance.get, connection_id
+    )
+    stored_key_future = redis_pool.submit(
+        guarded, "redis", redis_instance.get, assertion_key
+    )
+
+    nonce = wait(nonce_future)
+    if not nonce:
+        logger.info("No cached nonce")
+        return 32603
+
+    stored_key = wait(stored_key_future)
+    if not stored_key:
+        logger.info("No stored assertion key, the key must be attested again")
+        return 32610
+
+    # Keys stored before the app registry have no app, they were all
+    # attested for the default app.
+    counter, public_key, *app_name = stored_key.split(":", 2)
+    app = app_registry.for_name(app_name[0]) if app_name else app_registry.default
+    if app is None:
+        logger.info("Assertion key attested for an unregistered app")
+        return 32610
+
+    offer = build_offer("apple", app, app_version, os_version, connection_id)
+    if offer is None:
+        return 32604
+
+    assertion_counter = apple_pool.run(
+        run_stage,
+        "apple.verify_assertion",
+        apple.verify_assertion,
+        assertion_object,
+        base64.b64decode(public_key),
+        int(counter),
+        nonce,
+        app,
+    )
+    if assertion_counter is None:
+        logger.info("invalid assertion")
+        return 32606
+
+    updated = guarded(
+        "redis",
+        redis_instance.eval,
+        update_assertion_counter_script,
+        1,
+        assertion_key,
+        assertion_counter,
+        assertion_key_ttl,
+    )
+    if not updated:
+        logger.info("Assertion counter was already used")
+        return 32606
+
+    logger.info("valid assertion")
+    send_offer(offer)
+
+    return None
+
+
+def pipelined_validate_and_offer(
+    attestation_data, app, platform, app_version, os_version, connection_id
+):
+    """Validate an attestation while its nonce is fetched from Redis.
+
+    Only the nonce comparison needs the cached nonce, so decoding and all
+    the nonce independent checks run alongside the Redis lookup, and so
+    does fetching a new Traction token when the current one has expired.
+    The results are joined for the nonce bound checks.
+
+    `app` is the app requested for Play Integrity and None for Apple, an
+    Apple attestation is offered for whichever registered app it was made
+    by.
+    """
+    attestation_object, key_id = attestation_data
+
+    if platform not in ["apple", "google"]:
+        logger.info("unsupported platform")
+        return 32605
+
+    nonce_future = redis_pool.submit(
+        guarded, "redis", redis_instance.get, connection_id
+    )
+    token_future = prefetch_bearer_token()
+    if platform == "apple":
+        logger.info("testing apple challenge")
+        pool = apple_pool
+        prepared_future = pool.submit(
+            run_stage,
+            "apple.prepare_attestation",
+            apple.prepare_attestation,
+            attestation_object,
+            key_id,
+        )
+    else:
+        logger.info("testing google challenge")
+        pool = google_pool
+        prepared_future = pool.submit(
+            run_stage,
+            "google.decode_integrity_token",
+            goog.decode_integrity_token,
+            attestation_object,
+            app.android_package,
+        )
+
+    # Fetch the nonce cached for the connection. Without one there is
+    # nothing to verify against, so work that hasn't started yet gives its
+    # pool slot back.
+    try:
+        nonce = wait(nonce_future)
+    except Exception:
+        pool.cancel(prepared_future)
+        cancel_prefetch(token_future)
+        raise
+    if not nonce:
+        pool.cancel(prepared_future)
+        cancel_prefetch(token_future)
+        logger.info("No cached nonce")
+        return 32603
+
+    prepared = wait(prepared_future)
+    with stage(f"{platform}.verify_nonce"):
+        if prepared is None:
+            is_valid_challenge = False
+        elif platform == "apple":
+            app = apple.attested_app(prepared)
+            is_valid_challenge = apple.verify_attestation_nonce(prepared, nonce)
+        else:
+            is_valid_challenge = (
+                goog.isValidVerdict(prepared, nonce)
+                and goog.verdict_app(prepared) is app
+            )
+
+    if not is_valid_challenge:
+        logger.info("invalid challenge")
+        return 32606
+
+    logger.info("valid challenge for %s", app.name)
+    offer = build_offer(platform, app, app_version, os_version, connection_id)
+    if offer is None:
+        return 32604
+
+    if platform == "apple":
+        store_assertion_key(key_id, apple.extract_credential_public_key(prepared), app)
+
+    join_prefetch(token_future)
+    send_offer(offer)
+
+    return None
+
+
 def report_failure(drpc_request_id, code):
     return {
         "jsonrpc": "2.0",
@@ -280,6 +724,13 @@ def report_failure(drpc_request_id, code):
     }
 
 
+def read_webhook():
+    try:
+        return codec.loads(request.get_data(cache=False))
+    except codec.DecodeError:
+        abort(400)
+
+
 @server.route("/topic/ping/", methods=["POST", "GET"])
 def ping():
     if request.method == "POST":
@@ -289,14 +740,111 @@ def ping():
     return make_response("", 204)
 
 
+@server.route("/health/live", methods=["GET"])
+def health_live():
+    # Only says the worker is serving requests, dependencies are left to
+    # readiness so an outage doesn't get every pod restarted.
+    return jsonify({"status": "alive"})
+
+
+@server.route("/health/ready", methods=["GET"])
+def health_ready():
+    ready, report = readiness()
+    return make_response(jsonify(report), 200 if ready else 503)
+
+
+@server.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return make_response(metrics.render(), 200, {"Content-Type": metrics.content_type})
+
+
+@server.before_request
+def start_correlation():
+    # Request threads are reused, so every request starts a fresh context.
+    bind(request.headers.get("X-Request-ID"))
+    settings.ensure_watching()
+
+
+@server.before_request
+def track_busy():
+    # Only webhooks count towards utilization, probes and scrapes don't.
+    if request.path.startswith("/topic/"):
+        g.busy = True
+        worker_busy.inc()
+
+
+@server.teardown_request
+def untrack_busy(error):
+    if g.pop("busy", False):
+        worker_busy.dec()
+
+
+def require_debug_token():
+    # The debug endpoints are only served when DEBUG_TOKEN is set.
+    token = settings.current.debug_token
+    if not token:
+        abort(404)
+
+    supplied = request.headers.get("Authorization", "").encode("utf-8")
+    if not hmac.compare_digest(supplied, f"Bearer {token}".encode("utf-8")):
+        abort(401)
+
+
+@server.route("/debug/memory", methods=["GET"])
+def debug_memory():
+    require_debug_token()
+    return jsonify(profiling.report())
+
+
+@server.route("/debug/memory/snapshot", methods=["GET"])
+def debug_memory_snapshot():
+    require_debug_token()
+    if not profiling.enabled:
+        abort(409)
+
+    with tempfile.NamedTemporaryFile(suffix=".snap") as f:
+        profiling.dump_snapshot(f.name)
+        data = f.read()
+
+    return make_response(
+        data,
+        200,
+        {
+            "Content-Type": "application/octet-stream",
+            "X-Worker-Pid": str(os.getpid()),
+        },
+    )
+
+
+@server.route("/status/breakers/", methods=["GET"])
+def breakers():
+    return jsonify(breaker_states())
+
+
+@server.route("/status/cred_defs/", methods=["GET"])
+def cred_defs():
+    return jsonify(cred_def_registry.snapshot())
+
+
+@server.route("/status/pools/", methods=["GET"])
+def pools():
+    return jsonify(pool_saturation())
+
+
 @server.route("/topic/issue_credential/", methods=["POST"])
 def issue_credential():
     logger.info("Run POST /topic/issue_credential")
 
-    connection_id = request.get_json().get("connection_id")
-    state = request.get_json().get("state")
+    message = read_webhook()
+    connection_id = message.get("connection_id")
+    state = message.get("state")
 
-    print(f"Credential for connection id {connection_id}, sate {state}"),
+    logger.info("Credential for connection id %s, state %s", connection_id, state)
+    try:
+        with deadline(request_deadline):
+            offers.state_changed(connection_id, state)
+    except Exception as e:
+        logger.info("Unable to track credential for %s: %s", connection_id, e)
 
     return make_response("", 204)
 
@@ -306,15 +854,34 @@ def issue_credential():
 def drpc_request():
     logger.info("Run POST /topic/drpc_request/")
 
-    message = request.get_json()
+    message = read_webhook()
     connection_id = message["connection_id"]
     thread_id = message["thread_id"]
     req = message["request"]
     drpc_request = req["request"]
-
-    drpc_response = handle_drpc_request(drpc_request, connection_id)
-
-    send_drpc_response(connection_id, thread_id, drpc_response)
+    is_batch = isinstance(drpc_request, list)
+    method = "batch" if is_batch else drpc_request.get("method")
+    add_fields(connection_id=connection_id, method=method)
+    record("drpc_request", method, message)
+
+    # Every Redis and HTTP call made on behalf of this webhook shares
+    # a single time budget.
+    with deadline(request_deadline):
+        if is_batch:
+            drpc_response = handle_drpc_batch(drpc_request, connection_id)
+        else:
+            drpc_response = run_drpc_call(drpc_request, connection_id)
+
+        if is_batch and not drpc_response:
+            # Nothing to answer, as for a batch of notifications.
+            return make_response("", 204)
+
+        try:
+            traction_pool.run(
+                send_drpc_response, connection_id, thread_id, drpc_response
+            )
+        except (DependencyError, PoolSaturated) as e:
+            logger.error("Unable to send drpc response to %s: %s", connection_id, e)
 
     return make_response("", 204)
 
@@ -325,14 +892,28 @@ def drpc_request():
 def drpc_response():
     logger.info("Run POST /topic/drpc_response/")
 
-    message = request.get_json()
+    message = read_webhook()
     connection_id = message["connection_id"]
     drpc_response = message["response"]
+    method = drpc_response.get("request", {}).get("method")
+    add_fields(connection_id=connection_id, method=method)
+    record("drpc_response", method, message)
+    label = method if method in drpc_response_handlers else "unknown"
 
-    handle_drpc_response(drpc_response, connection_id)
+    with deadline(request_deadline), stage(f"method:{label}", request=True):
+        handle_drpc_response(drpc_response, connection_id)
 
     return make_response("", 204)
 
 
+# Only modules are loaded at import, which runs in the gunicorn master
+# before it binds. Trust anchors, clients and connections are warmed by
+# each worker's health probes once it is serving, so an unreachable
+# dependency holds back readiness rather than the bind and liveness.
+if warm_up_enabled:
+    warm_imports()
+
 if __name__ == "__main__":
+    if warm_up_enabled:
+        health.ensure_started()
     server.run(debug=True, port=5501, host="0.0.0.0")
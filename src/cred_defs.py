@@ -0,0 +1,164 @@
+import os
+import time
+import logging
+import threading
+import traction
+import settings
+import codec
+from constants import (
+    attestation_cred_def_ids,
+    attestation_schema_name,
+    attestation_schema_version,
+    cred_def_ttl,
+    cred_def_retry,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cred_def_id(cred_def_id):
+    # <issuer did>:3:CL:<schema seq no>:<tag>
+    parts = cred_def_id.split(":")
+    if len(parts) != 5 or parts[1] != "3":
+        return None
+    return parts[0], parts[4]
+
+
+class CredDefRegistry:
+    """Attestation cred defs by issuer DID and tag.
+
+    Starts from the seed in constants and the file written by
+    `scripts/provision.py` in CRED_DEFS_PATH, then discovers the cred defs
+    Traction created for the attestation schema. Lookups never wait on
+    Traction: once the set is older than its TTL the next lookup starts
+    a refresh in the background and is answered from the current set. If
+    a refresh fails the last known good set is kept.
+    """
+
+    def __init__(self, seed):
+        self.by_did_tag = {}
+        self.default_tags = {}
+        self.discovered = False
+        self.refreshed_at = None
+        self.next_refresh = 0.0
+        self.last_error = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._index(seed)
+
+    def _index(self, cred_def_ids):
+        by_did_tag = {}
+        default_tags = {}
+        for cred_def_id in cred_def_ids:
+            parsed = parse_cred_def_id(cred_def_id)
+            if parsed is None:
+                logger.warning("Ignoring malformed cred def id %s", cred_def_id)
+                continue
+            did, tag = parsed
+            by_did_tag[(did, tag)] = cred_def_id
+            # Traction lists cred defs oldest first, so the latest wins.
+            default_tags[did] = tag
+
+        # The tag in use stays the default while it still exists, so a
+        # new cred def is only picked up by setting ATTESTATION_CRED_DEF_TAG.
+        for did, tag in self.default_tags.items():
+            if (did, tag) in by_did_tag:
+                default_tags[did] = tag
+
+        # Swapped in whole, lookups never see a half built index.
+        self.by_did_tag, self.default_tags = by_did_tag, default_tags
+
+    def discover(self, did):
+        schema_id = f"{did}:2:{attestation_schema_name}:{attestation_schema_version}"
+        if not traction.get_schema(schema_id).get("schema_ids"):
+            raise LookupError(f"schema {schema_id} not found")
+
+        cred_def_ids = traction.get_cred_def(schema_id).get("credential_definition_ids")
+        if not cred_def_ids:
+            raise LookupError(f"no cred defs for schema {schema_id}")
+
+        return cred_def_ids
+
+    def refresh(self):
+        did = settings.current.traction_legacy_did
+        try:
+            cred_def_ids = self.discover(did)
+        except Exception as e:
+            self.last_error = str(e)
+            self.next_refresh = time.monotonic() + cred_def_retry
+            logger.warning("Unable to discover cred defs, keeping last known: %s", e)
+            raise
+        finally:
+            self._refreshing = False
+
+        # Cred defs of other issuers, e.g. from the seed, are kept.
+        known = [
+            cred_def_id
+            for (known_did, _), cred_def_id in self.by_did_tag.items()
+            if known_did != did
+        ]
+        self._index(known + cred_def_ids)
+        self.discovered = True
+        self.refreshed_at = time.time()
+        self.next_refresh = time.monotonic() + cred_def_ttl
+        self.last_error = None
+        logger.info("Discovered %s cred defs for %s", len(cred_def_ids), did)
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass
+
+    def ensure_discovered(self):
+        # For the warm-up stage and health probes, only calls Traction
+        # when nothing was discovered yet.
+        if not self.discovered:
+            self.refresh()
+
+    def lookup(self, did, tag=None):
+        if time.monotonic() >= self.next_refresh and not self._refreshing:
+            with self._lock:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(
+                        target=self._refresh_in_background,
+                        name="cred-def-refresh",
+                        daemon=True,
+                    ).start()
+
+        tag = (
+            tag
+            or settings.current.attestation_cred_def_tag
+            or self.default_tags.get(did)
+        )
+        return self.by_did_tag.get((did, tag))
+
+    def snapshot(self):
+        return {
+            "discovered": self.discovered,
+            "refreshed_at": self.refreshed_at,
+            "last_error": self.last_error,
+            "cred_defs": sorted(self.by_did_tag.values()),
+            "default_tags": dict(self.default_tags),
+        }
+
+
+def load_seed():
+    seed = list(attestation_cred_def_ids)
+    path = os.getenv("CRED_DEFS_PATH")
+    if path:
+        # Listed after the constants, so provisioned cred defs win.
+        seed += codec.load_file(path)["cred_def_ids"]
+    return seed
+
+
+registry = CredDefRegistry(load_seed())
+
+
+def refresh_soon(_):
+    # A new issuer's cred defs are discovered on the next lookup.
+    registry.next_refresh = 0.0
+
+
+settings.on_change(("traction_legacy_did",), refresh_soon)
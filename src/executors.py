@@ -0,0 +1,129 @@
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from resilience import remaining, DeadlineExceeded
+from metrics import pool_active, pool_queued
+from constants import (
+    apple_pool_workers,
+    apple_pool_queue,
+    google_pool_workers,
+    google_pool_queue,
+    traction_pool_workers,
+    traction_pool_queue,
+    redis_pool_workers,
+    redis_pool_queue,
+    batch_pool_workers,
+    batch_pool_queue,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturated(Exception):
+    def __init__(self, name):
+        super().__init__(f"{name} pool is saturated")
+        self.name = name
+
+
+def wait(future):
+    # Wait for work submitted to a pool, but no longer than the request
+    # deadline allows.
+    try:
+        return future.result(timeout=remaining())
+    except TimeoutError:
+        raise DeadlineExceeded("request deadline exceeded waiting on pool")
+
+
+class BoundedExecutor:
+    """A thread pool that rejects work instead of queueing without limit."""
+
+    def __init__(self, name, max_workers, max_queue):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.active = 0
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-pool"
+        )
+
+    def _publish(self):
+        pool_active.labels(self.name).set(self.active)
+        pool_queued.labels(self.name).set(self.pending)
+
+    def _run(self, context, fn, args, kwargs):
+        with self._lock:
+            self.pending -= 1
+            self.active += 1
+            self._publish()
+        try:
+            # Run inside the submitter's context so the request deadline
+            # follows the work onto the pool thread.
+            return context.run(fn, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self._publish()
+            self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            logger.warning("Rejecting work, %s pool is saturated", self.name)
+            raise PoolSaturated(self.name)
+
+        with self._lock:
+            self.pending += 1
+            self._publish()
+
+        context = contextvars.copy_context()
+        return self._executor.submit(self._run, context, fn, args, kwargs)
+
+    def run(self, fn, *args, **kwargs):
+        return wait(self.submit(fn, *args, **kwargs))
+
+    def cancel(self, future):
+        # Work that has started runs to the end, bounded by the deadline.
+        if future.cancel():
+            with self._lock:
+                self.pending -= 1
+                self._publish()
+            self._slots.release()
+
+    def saturation(self):
+        with self._lock:
+            capacity = self.max_workers + self.max_queue
+            return {
+                "workers": self.max_workers,
+                "queue_limit": self.max_queue,
+                "active": self.active,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "utilization": round((self.active + self.pending) / capacity, 3),
+            }
+
+
+apple_pool = BoundedExecutor("apple", apple_pool_workers, apple_pool_queue)
+google_pool = BoundedExecutor("google", google_pool_workers, google_pool_queue)
+traction_pool = BoundedExecutor("traction", traction_pool_workers, traction_pool_queue)
+redis_pool = BoundedExecutor("redis", redis_pool_workers, redis_pool_queue)
+# Batch calls submit work to the pools above, so they get their own pool
+# rather than waiting on a pool they may need.
+batch_pool = BoundedExecutor("batch", batch_pool_workers, batch_pool_queue)
+
+pools = {
+    pool.name: pool
+    for pool in [apple_pool, google_pool, traction_pool, redis_pool, batch_pool]
+}
+
+
+def pool_saturation():
+    return {name: pool.saturation() for name, pool in pools.items()}
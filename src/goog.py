@@ -1,73 +1,123 @@
-import os
 import logging
+import httplib2
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
-from dotenv import load_dotenv
-from constants import integrity_scope, bc_wallet_package_name, PLAY_RECOGNIZED
+from google_auth_httplib2 import AuthorizedHttp
+from constants import integrity_scope
+from resilience import guarded, timeout, DependencyError
+from apps import registry as app_registry
+from verdict_cache import cache as verdict_cache
+import verdict_policy
+from metrics import verdict_rejections
+import settings
 
-dev_mode = os.getenv("FLASK_ENV") == "development"
-allow_test_builds = os.getenv("ALLOW_TEST_BUILDS") == "true"
+logger = logging.getLogger(__name__)
 
-if dev_mode:
-    load_dotenv()
+# The credentials and discovery based service are reused across calls,
+# each call gets its own transport bound to the request deadline.
+credentials = None
+integrity_service = None
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 
-# should eventually confirm nonce matches here
-def isValidVerdict(verdict, nonce):
+def get_integrity_service():
+    global credentials, integrity_service
+
+    if integrity_service is None:
+        path = settings.current.google_auth_json_path
+        credentials = service_account.Credentials.from_service_account_file(
+            path, scopes=[integrity_scope]
+        )
+        # The endpoint is only overridden to run against a fake Google.
+        endpoint = settings.current.play_integrity_endpoint
+        integrity_service = build(
+            "playintegrity",
+            "v1",
+            credentials=credentials,
+            cache_discovery=False,
+            client_options={"api_endpoint": endpoint} if endpoint else None,
+        )
+
+    return integrity_service, credentials
+
+
+def reset_integrity_service(_):
+    # Rebuilt from the new key on the next call.
+    global credentials, integrity_service
+    credentials = integrity_service = None
+
+
+settings.on_change(
+    ("google_auth_json_path", "play_integrity_endpoint"), reset_integrity_service
+)
+
+
+def verdict_app(verdict):
+    # The registered app the verdict was issued for, if any.
     try:
-        print(verdict)
-        valid_device_verdicts = ["MEETS_DEVICE_INTEGRITY"]
-        verdict_nonce = verdict["tokenPayloadExternal"]["requestDetails"]["nonce"]
-        request_package_name = verdict["tokenPayloadExternal"]["requestDetails"][
-            "requestPackageName"
-        ]
         package_name = verdict["tokenPayloadExternal"]["appIntegrity"]["packageName"]
-        app_verdict = verdict["tokenPayloadExternal"]["appIntegrity"][
-            "appRecognitionVerdict"
-        ]
-        device_verdicts = verdict["tokenPayloadExternal"]["deviceIntegrity"][
-            "deviceRecognitionVerdict"
-        ]
-
-        if (
-            verdict_nonce == nonce
-            and request_package_name == bc_wallet_package_name
-            and package_name == bc_wallet_package_name
-            and set(valid_device_verdicts).issubset(device_verdicts)
-            and (app_verdict == PLAY_RECOGNIZED or allow_test_builds)
-        ):
-            return True
-        else:
+    except (KeyError, TypeError):
+        return None
+    return app_registry.for_package(package_name)
+
+
+def isValidVerdict(verdict, nonce):
+    try:
+        logger.debug("Verdict: %s", verdict)
+        app = verdict_app(verdict)
+        if app is None:
+            verdict_rejections.labels("unknown", "package").inc()
             return False
+
+        return verdict_policy.policies[app.name].evaluate(
+            verdict["tokenPayloadExternal"], nonce
+        )
     except Exception as e:
-        logger.error(f"Error evaluating verdict: {e}")
+        logger.error("Error evaluating verdict: %s", e)
         return False
 
 
+# Repeats of a token within its nonce window are answered from the cache.
+def decode_integrity_token(token, package_name=None):
+    package_name = package_name or app_registry.default.android_package
+    key = verdict_cache.key(package_name, token)
+    verdict = verdict_cache.get(key)
+    if verdict is None:
+        verdict = _decode_integrity_token(token, package_name)
+        if verdict is not None:
+            verdict_cache.put(key, verdict)
+
+    return verdict
+
+
 # decrypt the integrity token on google's servers
-def verify_integrity_token(token, nonce):
+def _decode_integrity_token(token, package_name):
     try:
-        path = os.getenv("GOOGLE_AUTH_JSON_PATH")
-        creds = service_account.Credentials.from_service_account_file(
-            path, scopes=[integrity_scope]
-        )
-        service = build("playintegrity", "v1", credentials=creds)
+        service, creds = get_integrity_service()
+        # httplib2 has no per-call timeout, so bind the remaining request
+        # budget to the transport used for this call.
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=timeout()))
         body = {"integrityToken": token}
         instance = service.v1()
-        verdict = instance.decodeIntegrityToken(
-            packageName=bc_wallet_package_name, body=body
-        ).execute()
-
-        if isValidVerdict(verdict, nonce):
-            return True
-        else:
-            return False
+        return guarded(
+            "google",
+            instance.decodeIntegrityToken(packageName=package_name, body=body).execute,
+            http=http,
+        )
+    except DependencyError:
+        raise
     except Exception as e:
-        logger.error(f"Error verifying integrity token: {e}")
+        logger.error("Error verifying integrity token: %s", e)
+        return None
+
+
+def verify_integrity_token(token, nonce, app=None):
+    app = app or app_registry.default
+    verdict = decode_integrity_token(token, app.android_package)
+    if verdict is None:
         return False
 
+    return isValidVerdict(verdict, nonce) and verdict_app(verdict) is app
+
 
 def main():
     pass
@@ -0,0 +1,96 @@
+"""Gunicorn serving profile for the controller.
+
+Every setting can be overridden with the environment variable read next
+to it. The defaults were chosen with `scripts/bench_workers.py`; rerun it
+before changing them.
+"""
+
+import os
+import shutil
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+if worker_class == "gevent":
+    # Patch before the app is preloaded, otherwise the locks and sockets
+    # created while importing the controller are the blocking kind.
+    from gevent import monkey
+
+    monkey.patch_all()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# Only used by gthread, the request handlers mostly wait on I/O.
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Only used by gevent.
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100"))
+
+# Import the app once in the master so the workers share its modules
+# copy-on-write. Nothing calls out before the bind, each worker warms its
+# dependencies in the background once serving, see post_worker_init.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true") == "true"
+
+# Recycle workers to bound slow memory growth, with jitter so they don't
+# all restart together.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# Longer than the per-request deadline (`request_deadline`), shorter than
+# the 60s route timeout.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "45"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Traction calls the webhooks through the OpenShift router, which keeps
+# connections open, so keep-alive saves a connect per webhook.
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG")
+
+# Workers write their metrics here so /metrics can report the whole pod.
+# Prepared here rather than in a server hook, as the app is preloaded and
+# prometheus_client opens the directory on import. Values left by a
+# previous run would be summed with the new ones, so start empty.
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", "/tmp/controller-metrics"
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir)
+
+
+def post_fork(server, worker):
+    # Connections opened in the master during preload must not be shared
+    # between workers, drop them so each worker opens its own.
+    from redis_config import redis_instance
+    from log_setup import configure_logging
+    import traction
+
+    configure_logging()
+    redis_instance.reset()
+    traction.reset_session()
+
+    from metrics import worker_capacity
+
+    if worker_class == "gevent":
+        worker_capacity.set(worker_connections)
+    elif worker_class == "gthread":
+        worker_capacity.set(threads)
+    else:
+        worker_capacity.set(1)
+
+
+def post_worker_init(worker):
+    # Gunicorn resets the worker's signal handlers after post_fork, so
+    # SIGHUP is only taken over once the worker is initialized.
+    import settings
+    from warmup import warm_up_enabled
+
+    settings.install_sighup()
+
+    if warm_up_enabled:
+        import health
+
+        health.ensure_started()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,84 @@
+import time
+import logging
+from background import start_once
+from warmup import stages, warm_state
+from resilience import breaker_states
+from constants import health_refresh_interval, health_stale_after, readiness_required
+
+logger = logging.getLogger(__name__)
+
+# Latest result of each dependency probe, refreshed in the background so
+# health checks never call out to the dependencies themselves.
+probe_results = {}
+
+
+def probe(name, stage):
+    # The warm-up stages return early once their cache is loaded, so only
+    # Redis is actually contacted on every refresh.
+    start = time.monotonic()
+    try:
+        stage()
+        result = {"ok": True}
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+    result["latency_ms"] = round((time.monotonic() - start) * 1000, 1)
+    result["checked_at"] = time.time()
+
+    if warm_state.get(name) is not result["ok"]:
+        if result["ok"]:
+            logger.info("Warmed %s in %sms", name, result["latency_ms"])
+        else:
+            logger.warning("Unable to warm %s: %s", name, result["error"])
+    probe_results[name] = result
+    warm_state[name] = result["ok"]
+
+
+def refresh():
+    for name, stage in stages.items():
+        probe(name, stage)
+
+
+def _refresh_forever():
+    while True:
+        try:
+            refresh()
+        except Exception as e:
+            logger.warning("Unable to refresh health probes: %s", e)
+        time.sleep(health_refresh_interval)
+
+
+def ensure_started():
+    # Threads don't survive into forked gunicorn workers, so each worker
+    # starts its own, once it is serving or on the first health check. The
+    # first round of probes is the worker's warm-up, and until it completes
+    # the worker reports not ready.
+    start_once("health-probes", _refresh_forever)
+
+
+def readiness():
+    ensure_started()
+
+    now = time.time()
+    breakers = breaker_states()
+    checks = {}
+    for name in stages:
+        # Copied, the breaker state must not leak into the shared results.
+        result = dict(probe_results.get(name, {}))
+        if not result:
+            result = {"ok": False, "error": "not probed yet"}
+        elif now - result["checked_at"] > health_stale_after:
+            result["ok"] = False
+            result["error"] = "stale probe result"
+        if name in breakers:
+            result["breaker"] = breakers[name]["state"]
+        checks[name] = result
+
+    ready = all(checks[name]["ok"] for name in readiness_required)
+    if not ready:
+        status = "not_ready"
+    elif all(check["ok"] for check in checks.values()):
+        status = "ready"
+    else:
+        status = "degraded"
+
+    return ready, {"status": status, "checks": checks, "warm": dict(warm_state)}
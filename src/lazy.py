@@ -0,0 +1,34 @@
+import threading
+import importlib
+
+
+class LazyModule:
+    """A module that is only imported on first attribute access.
+
+    Used for the platform modules so a worker that only serves nonce
+    requests never pays for `cryptography`, `pyasn1` or `googleapiclient`.
+    The first access may come from several pool threads at once, so the
+    import runs under a lock and every thread sees the fully executed
+    module. `importlib.util.LazyLoader` doesn't guarantee that on the
+    Python versions we run.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._module or self._load()
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
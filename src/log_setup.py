@@ -0,0 +1,217 @@
+"""Central logging setup for the controller.
+
+Records are put on an in-process queue by the request threads and
+formatted, redacted and written by a single listener thread, so a log
+call on the request path costs little more than building the record.
+Messages use lazy %-style arguments, which are only merged into the
+message once the listener formats the record.
+
+Settings:
+
+- LOG_LEVEL, INFO by default.
+- LOG_FORMAT, `json` by default, or `text` for local development.
+- LOG_SAMPLE_RATE, the share of requests whose INFO and DEBUG records
+  are kept. 1 by default. The choice is made once per correlation ID,
+  so a sampled request keeps all of its records. Warnings and errors are
+  always kept.
+"""
+
+import os
+import re
+import sys
+import time
+import uuid
+import queue
+import atexit
+import hashlib
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+import codec
+from background import once_per_process, running
+
+# The current request's correlation ID and extra fields, copied onto
+# every record logged on its behalf, pool threads included.
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+log_fields = contextvars.ContextVar("log_fields", default={})
+
+_sensitive_keys = (
+    r"(?:nonce|token|integrityToken|attestation_object|assertion_object|key_id"
+    r"|api_key|Authorization)"
+)
+
+_redact_patterns = [
+    # "key": "value" as in JSON and dict reprs, and key=value, for sensitive
+    # names. Prose such as "integrity token: expected str" is left alone.
+    (
+        re.compile(
+            rf"""(?P<key>(?:(?P<quote>['"]){_sensitive_keys}(?P=quote)\s*:"""
+            rf"""|{_sensitive_keys}=)\s*)"""
+            r"""['"]?(?:Bearer\s+)?[^'",\s})]+['"]?""",
+            re.IGNORECASE,
+        ),
+        r"\g<key>[redacted]",
+    ),
+    # JWTs, such as bearer tokens and integrity tokens
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*"), "[redacted jwt]"),
+    # Base64 or hex blobs, such as attestation objects
+    (re.compile(r"[A-Za-z0-9+/=_-]{64,}"), "[redacted blob]"),
+]
+
+
+_sensitive_key = re.compile(_sensitive_keys, re.IGNORECASE)
+# A whole argument or field that is one base64 or hex token, such as a
+# 44 character App Attest key ID, is too short for the blob pattern
+# above but still an identifier that must not be logged.
+_secret_value = re.compile(r"[A-Za-z0-9+/_-]{40,}={0,2}")
+
+
+def redact(message):
+    for pattern, replacement in _redact_patterns:
+        message = pattern.sub(replacement, message)
+    return message
+
+
+def redact_value(value, key=None):
+    """Redact a log argument or field, rather than text in a message."""
+    if key is not None and _sensitive_key.fullmatch(key):
+        return "[redacted]"
+    if isinstance(value, str):
+        if _secret_value.fullmatch(value):
+            return "[redacted]"
+        return redact(value)
+    return value
+
+
+def redact_args(record):
+    # Done before the arguments are merged into the message, where a
+    # value on its own could no longer be told apart from the text.
+    if isinstance(record.args, dict):
+        record.args = {key: redact_value(arg, key) for key, arg in record.args.items()}
+    elif record.args:
+        record.args = tuple(redact_value(arg) for arg in record.args)
+
+
+def new_correlation_id():
+    return uuid.uuid4().hex[:16]
+
+
+def bind(cid=None):
+    """Start a new correlation ID, dropping any fields from before."""
+    correlation_id.set(cid or new_correlation_id())
+    log_fields.set({})
+
+
+def add_fields(**fields):
+    """Add fields to every record logged in the current context."""
+    log_fields.set({**log_fields.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Captures the context on the calling thread and applies sampling."""
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        # Compared against the first 32 bits of the correlation ID hash.
+        self.threshold = int(sample_rate * 0xFFFFFFFF)
+
+    def filter(self, record):
+        cid = correlation_id.get()
+        record.correlation_id = cid
+        record.fields = log_fields.get()
+
+        if record.levelno >= logging.WARNING or cid is None:
+            return True
+        if self.threshold >= 0xFFFFFFFF:
+            return True
+        digest = hashlib.blake2b(cid.encode("ascii"), digest_size=4).digest()
+        return int.from_bytes(digest, "big") <= self.threshold
+
+
+class LazyQueueHandler(QueueHandler):
+    # The stock handler formats on the calling thread, leave it to the
+    # listener instead.
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        redact_args(record)
+        entry["msg"] = redact(record.getMessage())
+        cid = getattr(record, "correlation_id", None)
+        if cid:
+            entry["correlation_id"] = cid
+        for key, value in getattr(record, "fields", {}).items():
+            entry[key] = redact_value(value, key)
+        if record.exc_info:
+            entry["exc"] = redact(self.formatException(record.exc_info))
+
+        return codec.dumps(entry).decode("utf-8")
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(cid)s] %(message)s")
+
+    def format(self, record):
+        record.cid = getattr(record, "correlation_id", None) or "-"
+        redact_args(record)
+        return redact(super().format(record))
+
+
+_listener = None
+
+
+def configure_logging():
+    """Install the queue handler on the root logger.
+
+    Safe to call more than once, and called again after a fork because
+    the listener thread doesn't survive into gunicorn workers.
+    """
+    once_per_process("logging", _install)
+
+
+def _install():
+    global _listener
+
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    sample_rate = min(1.0, max(0.0, float(os.getenv("LOG_SAMPLE_RATE", "1"))))
+
+    output = logging.StreamHandler(sys.stderr)
+    if os.getenv("LOG_FORMAT", "json") == "text":
+        output.setFormatter(TextFormatter())
+    else:
+        output.setFormatter(JsonFormatter())
+
+    records = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    handler.addFilter(ContextFilter(sample_rate))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, LazyQueueHandler) or _listener is None:
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    # The listener inherited from the master, if any, is gone with its
+    # thread, so a new one is started without stopping it.
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+
+def _flush():
+    # Let the listener drain the queue before the process exits.
+    if _listener is not None and running("logging"):
+        deadline = time.monotonic() + 2
+        while not _listener.queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+atexit.register(_flush)
@@ -0,0 +1,96 @@
+"""Prometheus gauges used to autoscale on demand rather than CPU.
+
+Under gunicorn every worker keeps its own values. When
+PROMETHEUS_MULTIPROC_DIR is set, which `gunicorn.conf.py` does, each
+worker writes them to that directory and `/metrics` sums the live
+workers, so a scrape reports the whole pod whichever worker answers it.
+"""
+
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+content_type = CONTENT_TYPE_LATEST
+
+drpc_inflight = Gauge(
+    "controller_drpc_inflight",
+    "DRPC requests being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+worker_busy = Gauge(
+    "controller_worker_busy_threads",
+    "Request threads handling a webhook",
+    multiprocess_mode="livesum",
+)
+worker_capacity = Gauge(
+    "controller_worker_capacity_threads",
+    "Webhooks the workers can handle at once",
+    multiprocess_mode="livesum",
+)
+pending_offers = Gauge(
+    "controller_pending_offers",
+    "Credential offers waiting to be sent to Traction",
+    multiprocess_mode="livesum",
+)
+pool_active = Gauge(
+    "controller_pool_active",
+    "Tasks running on an execution pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+pool_queued = Gauge(
+    "controller_pool_queued",
+    "Tasks waiting for an execution pool thread",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+outcome_events = Counter(
+    "controller_outcome_events",
+    "Attestation outcome events by what became of them",
+    ["status"],
+)
+time_to_credential = Histogram(
+    "controller_time_to_credential_seconds",
+    "Time from sending an offer to each later issue-credential state",
+    ["state"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1800),
+)
+offers = Counter(
+    "controller_offers",
+    "Credential offers by what became of them",
+    ["outcome"],
+)
+stuck_offers = Gauge(
+    "controller_stuck_offers",
+    "Offers sent a while ago whose credential hasn't been issued",
+    multiprocess_mode="max",
+)
+verdict_cache = Counter(
+    "controller_verdict_cache",
+    "Play Integrity verdict lookups by the tier that answered them",
+    ["result"],
+)
+verdict_rejections = Counter(
+    "controller_verdict_rejections",
+    "Play Integrity verdicts rejected, by app and the first rule failed",
+    ["app", "rule"],
+)
+
+
+def render():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry)
@@ -0,0 +1,138 @@
+"""Lifecycle of credential offers, from sending to the issued credential.
+
+When an offer is sent, a record of it is kept in Redis under the
+connection ID for `offer_ttl` seconds, and the connection is added to a
+sorted set of pending offers scored by when the offer was sent. The
+issue-credential webhooks are linked to the record by connection ID, and
+the time from the offer to each later state is observed in
+`controller_time_to_credential_seconds`. An issued or abandoned offer
+leaves the pending set.
+
+A background thread in each worker counts the pending offers sent more
+than `offer_stuck_after` seconds ago as stuck, and drops those past
+`offer_ttl`, which are counted as expired.
+"""
+
+import time
+import logging
+import codec
+from redis_config import redis_instance
+from background import start_once
+from resilience import guarded
+from metrics import time_to_credential, offers, stuck_offers
+from constants import (
+    offer_key_prefix,
+    pending_offers_key,
+    offer_ttl,
+    offer_stuck_after,
+    offer_scan_interval,
+)
+
+logger = logging.getLogger(__name__)
+
+# ACA-Py issue-credential states, v1 and v2 protocol names alike, in the
+# order an exchange goes through them.
+states = {
+    "offer_sent": "offer_sent",
+    "offer-sent": "offer_sent",
+    "request_received": "request_received",
+    "request-received": "request_received",
+    "credential_issued": "credential_issued",
+    "credential-issued": "credential_issued",
+    "credential_acked": "credential_acked",
+    "done": "credential_acked",
+    "abandoned": "abandoned",
+}
+progress = ["offer_sent", "request_received", "credential_issued", "credential_acked"]
+finished = {"credential_issued", "credential_acked", "abandoned"}
+
+
+def offer_sent(connection_id, cred_def_id):
+    ensure_started()
+    now = time.time()
+    record = {"sent_at": now, "cred_def_id": cred_def_id, "state": "offer_sent"}
+    try:
+        guarded(
+            "redis",
+            redis_instance.setex,
+            f"{offer_key_prefix}{connection_id}",
+            offer_ttl,
+            codec.dumps(record),
+        )
+        guarded("redis", redis_instance.zadd, pending_offers_key, {connection_id: now})
+        offers.labels("sent").inc()
+    except Exception as e:
+        # Tracking never fails the offer itself.
+        logger.info("Unable to track offer for %s: %s", connection_id, e)
+
+
+def _advances(old, new):
+    if new == "abandoned":
+        return old not in finished
+    if old == "abandoned":
+        return False
+    return progress.index(new) > progress.index(old)
+
+
+def state_changed(connection_id, state):
+    """Link an issue-credential webhook to the offer sent on the connection."""
+    ensure_started()
+    state = states.get(state)
+    if state is None or connection_id is None:
+        return
+
+    key = f"{offer_key_prefix}{connection_id}"
+    stored = guarded("redis", redis_instance.get, key)
+    if not stored:
+        return
+    record = codec.loads(stored)
+    # Webhooks may be retried or arrive out of order, each state of an
+    # offer is observed once.
+    if not _advances(record["state"], state):
+        return
+
+    time_to_credential.labels(state).observe(time.time() - record["sent_at"])
+    if state in finished and record["state"] not in finished:
+        guarded("redis", redis_instance.zrem, pending_offers_key, connection_id)
+        offers.labels("abandoned" if state == "abandoned" else "issued").inc()
+
+    record["state"] = state
+    if state in ("credential_acked", "abandoned"):
+        guarded("redis", redis_instance.delete, key)
+    else:
+        ttl = max(1, int(record["sent_at"] + offer_ttl - time.time()))
+        guarded("redis", redis_instance.setex, key, ttl, codec.dumps(record))
+
+
+def scan():
+    now = time.time()
+    expired = guarded(
+        "redis",
+        redis_instance.zremrangebyscore,
+        pending_offers_key,
+        "-inf",
+        now - offer_ttl,
+    )
+    if expired:
+        offers.labels("expired").inc(expired)
+    stuck = guarded(
+        "redis",
+        redis_instance.zcount,
+        pending_offers_key,
+        "-inf",
+        now - offer_stuck_after,
+    )
+    stuck_offers.set(stuck)
+
+
+def _scan_forever():
+    while True:
+        try:
+            scan()
+        except Exception as e:
+            logger.warning("Unable to count stuck offers: %s", e)
+        time.sleep(offer_scan_interval)
+
+
+def ensure_started():
+    start_once("offer-scan", _scan_forever)
@@ -0,0 +1,138 @@
+"""Attestation outcome events for analytics.
+
+Each attestation attempt emits one compact event with its platform, OS
+and app versions, result code and stage timings. Events are queued in
+memory and flushed in batches by a background thread, to the Redis
+Stream named by OUTCOME_STREAM or to per-worker JSON line files in the
+OUTCOME_PATH directory. When the queue is full the event is dropped and
+counted, so emitting never blocks the request path.
+
+Counts of written, dropped and failed events are exported as
+`controller_outcome_events_total`.
+"""
+
+import os
+import time
+import queue
+import logging
+import codec
+from redis_config import redis_instance
+from background import start_once
+from rotation import RotatingFile
+from metrics import outcome_events
+from log_setup import correlation_id
+from constants import (
+    outcome_queue_size,
+    outcome_batch_size,
+    outcome_flush_interval,
+    outcome_stream_maxlen,
+    outcome_max_bytes,
+    outcome_backups,
+)
+
+logger = logging.getLogger(__name__)
+
+stream_name = os.getenv("OUTCOME_STREAM")
+outcome_path = os.getenv("OUTCOME_PATH")
+
+
+class StreamSink:
+    def __init__(self, name):
+        self.name = name
+
+    def open(self):
+        pass
+
+    def write(self, events):
+        # One round trip per batch, the stream is trimmed as it grows.
+        pipe = redis_instance.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(
+                self.name,
+                {"event": codec.dumps(event)},
+                maxlen=outcome_stream_maxlen,
+                approximate=True,
+            )
+        pipe.execute()
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+        name = os.path.join(self.path, f"outcomes-{os.getpid()}.jsonl")
+        self.file = RotatingFile(name, outcome_max_bytes, outcome_backups)
+
+    def write(self, events):
+        self.file.write(b"".join(codec.dumps(event) + b"\n" for event in events))
+        self.file.flush()
+
+
+class OutcomeStream:
+    """Buffers outcome events and writes them to `sink` in batches."""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=outcome_queue_size)
+
+    def emit(self, event):
+        start_once("outcomes", self._flush_forever)
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            outcome_events.labels("dropped").inc()
+
+    def _next_batch(self):
+        # Wait for one event, then give the batch a moment to fill.
+        batch = [self.queue.get()]
+        flush_at = time.monotonic() + outcome_flush_interval
+        while len(batch) < outcome_batch_size:
+            left = flush_at - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=left))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush_forever(self):
+        self.sink.open()
+        while True:
+            batch = self._next_batch()
+            try:
+                self.sink.write(batch)
+                outcome_events.labels("written").inc(len(batch))
+            except Exception as e:
+                outcome_events.labels("failed").inc(len(batch))
+                logger.warning("Unable to write %s outcome events: %s", len(batch), e)
+
+
+if stream_name:
+    stream = OutcomeStream(StreamSink(stream_name))
+elif outcome_path:
+    stream = OutcomeStream(FileSink(outcome_path))
+else:
+    stream = None
+
+
+def emit(method, platform, app_version, os_version, code, timings):
+    """Queue the outcome of an attestation, `code` is None on success."""
+    if stream is None:
+        return
+
+    stream.emit(
+        {
+            "ts": round(time.time(), 3),
+            "cid": correlation_id.get(),
+            "method": method,
+            "platform": platform,
+            "os_version": os_version,
+            "app_version": app_version,
+            "code": code or 0,
+            "timings": dict(timings),
+        }
+    )
@@ -0,0 +1,204 @@
+"""Opt-in allocation profiling per DRPC method and verification stage.
+
+With MEMORY_PROFILING set to `true`, tracemalloc traces every allocation
+and each `stage()` records how much memory the stage kept allocated. The
+stages wrapping a whole DRPC method also record the peak reached while
+the request ran. Every `profiling_snapshot_every` runs of a stage, a
+snapshot is taken before and after it, and the lines that allocated the
+most in between are kept.
+
+Stages are also timed for requests that collect their timings with
+`collect_timings()`, whether profiling is enabled or not.
+
+Tracing costs CPU and memory, so leave it off unless investigating.
+tracemalloc counts every thread, so with more than one request thread
+the numbers include concurrent requests. For exact per-request figures,
+profile a worker with GUNICORN_THREADS=1.
+"""
+
+import os
+import time
+import queue
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+from background import start_once
+from constants import (
+    profiling_frames,
+    profiling_snapshot_every,
+    profiling_top_lines,
+)
+
+enabled = os.getenv("MEMORY_PROFILING", "false") == "true"
+frames = int(os.getenv("MEMORY_PROFILING_FRAMES", profiling_frames))
+
+# Keyed by stage name, e.g. "method:request_attestation_v2".
+stage_stats = {}
+
+# Milliseconds taken by each stage of the current request, when it
+# collects them. Pool threads run in a copy of the request's context, so
+# they add to the same dictionary.
+stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+_lock = threading.Lock()
+# Comparing snapshots takes seconds, so it's done off the request path.
+# Holds at most one pair, further pairs are skipped until it's compared.
+_pairs = queue.Queue(maxsize=1)
+
+_filters = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+    tracemalloc.Filter(False, __file__),
+]
+
+
+def start():
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_filters)
+
+
+def top_lines(before, after):
+    stats = after.compare_to(before, "lineno")
+    return [
+        {
+            "line": str(stat.traceback),
+            "size_diff": stat.size_diff,
+            "count_diff": stat.count_diff,
+        }
+        for stat in stats[:profiling_top_lines]
+        if stat.size_diff > 0
+    ]
+
+
+def _compare_forever():
+    while True:
+        name, before, after = _pairs.get()
+        top = top_lines(before, after)
+        with _lock:
+            stage_stats[name]["top_lines"] = top
+
+
+def _compare_later(name, before, after):
+    start_once("profiling", _compare_forever)
+    try:
+        _pairs.put_nowait((name, before, after))
+    except queue.Full:
+        pass
+
+
+def _record(name, allocated, peak, duration):
+    with _lock:
+        stats = stage_stats.setdefault(
+            name,
+            {
+                "count": 0,
+                "allocated_total": 0,
+                "allocated_max": 0,
+                "peak_max": 0,
+                "seconds_total": 0.0,
+                "top_lines": [],
+            },
+        )
+        stats["count"] += 1
+        stats["allocated_total"] += allocated
+        stats["allocated_max"] = max(stats["allocated_max"], allocated)
+        stats["seconds_total"] += duration
+        if peak is not None:
+            stats["peak_max"] = max(stats["peak_max"], peak)
+
+
+def collect_timings():
+    """Time the stages run from here on in the current context."""
+    timings = {}
+    stage_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def _timed(name, timings):
+    start_time = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.monotonic() - start_time) * 1000, 2)
+
+
+def _due(name):
+    with _lock:
+        count = stage_stats.get(name, {}).get("count", 0)
+    return count % profiling_snapshot_every == 0 and _pairs.empty()
+
+
+@contextmanager
+def stage(name, request=False):
+    """Profile the block as `name`, a no-op unless profiling is enabled.
+
+    `request` marks the outermost stage of a request, which also resets
+    and records the peak.
+    """
+    if not enabled or not tracemalloc.is_tracing():
+        timings = stage_timings.get()
+        if timings is None:
+            yield
+        else:
+            with _timed(name, timings):
+                yield
+        return
+
+    before = take_snapshot() if _due(name) else None
+    if request:
+        tracemalloc.reset_peak()
+    current, _ = tracemalloc.get_traced_memory()
+    start_time = time.monotonic()
+    try:
+        yield
+    finally:
+        duration = time.monotonic() - start_time
+        timings = stage_timings.get()
+        if timings is not None:
+            timings[name] = round(duration * 1000, 2)
+        after_current, peak = tracemalloc.get_traced_memory()
+        _record(
+            name,
+            after_current - current,
+            peak - current if request else None,
+            duration,
+        )
+        if before is not None:
+            _compare_later(name, before, take_snapshot())
+
+
+def run_stage(name, fn, *args, **kwargs):
+    # For submitting a profiled call to an execution pool.
+    with stage(name):
+        return fn(*args, **kwargs)
+
+
+def report():
+    current, peak = tracemalloc.get_traced_memory() if enabled else (0, 0)
+    with _lock:
+        stages = {}
+        for name, stats in stage_stats.items():
+            stages[name] = dict(
+                stats,
+                allocated_avg=stats["allocated_total"] // stats["count"],
+                seconds_avg=round(stats["seconds_total"] / stats["count"], 6),
+            )
+
+    return {
+        "enabled": enabled,
+        "pid": os.getpid(),
+        "traced_current": current,
+        "traced_peak": peak,
+        "stages": stages,
+    }
+
+
+def dump_snapshot(path):
+    take_snapshot().dump(path)
@@ -0,0 +1,98 @@
+import os
+import time
+import queue
+import hashlib
+import logging
+import codec
+from background import start_once
+from rotation import RotatingFile
+from constants import (
+    record_queue_size,
+    record_max_bytes,
+    record_backups,
+    redacted_fields,
+)
+
+logger = logging.getLogger(__name__)
+
+# Opt-in, set to a directory to record inbound DRPC webhooks there.
+record_path = os.getenv("DRPC_RECORD_PATH")
+
+
+def pseudonym(value):
+    # Stable within a capture, so replay can still pair a nonce request
+    # with the attestation on the same connection.
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+def redact(value):
+    if isinstance(value, dict):
+        redacted = {}
+        for key, item in value.items():
+            if key in redacted_fields and isinstance(item, str):
+                # Keep the length, replay fills it back in with filler.
+                redacted[key] = f"~redacted:{len(item)}"
+            elif key in ("connection_id", "thread_id") and isinstance(item, str):
+                redacted[key] = pseudonym(item)
+            else:
+                redacted[key] = redact(item)
+        return redacted
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+
+    return value
+
+
+class Recorder:
+    """Writes redacted DRPC webhooks to rotating JSON line files.
+
+    Webhooks are queued and written by a background thread, so recording
+    never blocks the request path; when the queue is full the record is
+    dropped and counted instead.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue(maxsize=record_queue_size)
+        self.dropped = 0
+        self.written = 0
+
+    def record(self, route, method, message):
+        start_once("drpc-recorder", self._write_forever)
+        try:
+            self.queue.put_nowait((time.time(), route, method, message))
+        except queue.Full:
+            self.dropped += 1
+
+    def _file_name(self):
+        return os.path.join(self.path, f"drpc-{os.getpid()}.jsonl")
+
+    def _write_forever(self):
+        os.makedirs(self.path, exist_ok=True)
+        f = RotatingFile(self._file_name(), record_max_bytes, record_backups)
+        while True:
+            ts, route, method, message = self.queue.get()
+            line = codec.dumps(
+                {
+                    "ts": ts,
+                    "route": route,
+                    "method": method,
+                    "message": redact(message),
+                }
+            )
+            try:
+                f.write(line + b"\n")
+                self.written += 1
+                # Flush once the queue is drained, not on every record.
+                if self.queue.empty():
+                    f.flush()
+            except OSError as e:
+                logger.warning("Unable to write DRPC record: %s", e)
+
+
+recorder = Recorder(record_path) if record_path else None
+
+
+def record(route, method, message):
+    if recorder is not None:
+        recorder.record(route, method, message)
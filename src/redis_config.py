@@ -1,9 +1,76 @@
 # import redis
 import os
+import threading
+from redis.connection import SSLConnection
 from rediscluster import RedisCluster
+from rediscluster.connection import ClusterConnection, SSLClusterConnection
+from constants import dependency_timeout
+from resilience import timeout
 
 # Get the Redis URL from environment variables
 redis_uri = os.getenv("REDIS_URI")
 
+
+class DeadlineMixin:
+    """Bounds each command by what is left of the request deadline.
+
+    The socket timeout is set before the command is sent, so it also
+    covers reading the reply. Once the deadline has passed the command is
+    not sent at all.
+    """
+
+    def send_packed_command(self, command, check_health=True):
+        self.socket_timeout = timeout()
+        if self._sock is not None:
+            self._sock.settimeout(self.socket_timeout)
+        super().send_packed_command(command, check_health)
+
+
+class DeadlineClusterConnection(DeadlineMixin, ClusterConnection):
+    pass
+
+
+class DeadlineSSLClusterConnection(DeadlineMixin, SSLClusterConnection):
+    pass
+
+
+class LazyRedisCluster:
+    """Connects to the Redis Cluster on first use instead of at import.
+
+    Importing the controller no longer needs a reachable cluster, and a
+    client created before a fork can be dropped with `reset`.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    client = RedisCluster.from_url(
+                        redis_uri,
+                        decode_responses=True,
+                        socket_timeout=dependency_timeout,
+                        socket_connect_timeout=dependency_timeout,
+                    )
+                    pool = client.connection_pool
+                    if issubclass(pool.connection_class, SSLConnection):
+                        pool.connection_class = DeadlineSSLClusterConnection
+                    else:
+                        pool.connection_class = DeadlineClusterConnection
+                    self._client = client
+
+        return self._client
+
+    def reset(self):
+        with self._lock:
+            self._client = None
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
+
+
 # redis_instance = redis.from_url(redis_url, decode_responses=True)
-redis_instance = RedisCluster.from_url(redis_uri, decode_responses=True)
+redis_instance = LazyRedisCluster()
@@ -0,0 +1,16 @@
+"""Lua scripts run atomically inside Redis."""
+
+# Only advance the stored sign counter, so a replayed or concurrent
+# assertion with the same counter can not be used twice.
+update_assertion_counter_script = """
+local stored = redis.call('GET', KEYS[1])
+if not stored then
+    return 0
+end
+local separator = string.find(stored, ':')
+if tonumber(string.sub(stored, 1, separator - 1)) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1] .. string.sub(stored, separator), 'EX', ARGV[2])
+return 1
+"""
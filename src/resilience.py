@@ -0,0 +1,202 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from constants import (
+    dependency_timeout,
+    breaker_failure_threshold,
+    breaker_slow_call_threshold,
+    breaker_reset_timeout,
+)
+
+logger = logging.getLogger(__name__)
+
+# Absolute monotonic time by which the current inbound request must finish.
+_deadline = ContextVar("deadline", default=None)
+
+
+class DependencyError(Exception):
+    """Raised when a downstream dependency can not be used for this request."""
+
+
+class DeadlineExceeded(DependencyError):
+    pass
+
+
+class CircuitOpenError(DependencyError):
+    def __init__(self, name):
+        super().__init__(f"circuit breaker for {name} is open")
+        self.name = name
+
+
+@contextmanager
+def deadline(seconds):
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+
+    return expires_at - time.monotonic()
+
+
+def timeout(cap=dependency_timeout):
+    # The timeout for a single outbound call is whatever is left of the
+    # request budget, capped so one slow dependency can't use all of it.
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+
+    return min(left, cap)
+
+
+def budget_spent():
+    # True once the current request has used up its budget. A call that
+    # fails then was cut short by the caller's timeout, which says
+    # nothing about the health of the dependency.
+    left = remaining()
+    return left is not None and left <= 0
+
+
+class CircuitBreaker:
+    """Fails calls to a dependency fast after repeated failures.
+
+    `is_failure` is given the return value, or the exception raised, and
+    decides whether it counts against the dependency. Without it every
+    exception does. Calls cut short because the request ran out of time
+    are not counted either way.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=breaker_failure_threshold,
+        slow_call_threshold=breaker_slow_call_threshold,
+        reset_timeout=breaker_reset_timeout,
+        is_failure=None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if (
+                self.state == self.OPEN
+                and time.monotonic() - self.opened_at >= self.reset_timeout
+            ):
+                # Let a single trial call through to probe the dependency.
+                self.state = self.HALF_OPEN
+                return
+
+            self.rejected += 1
+            raise CircuitOpenError(self.name)
+
+    def _release(self):
+        # The call neither passed nor failed, so a half-open breaker lets
+        # the next call probe again instead of waiting on this one.
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def _record(self, ok):
+        with self._lock:
+            if ok:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    logger.warning(
+                        "Circuit breaker %s tripped after %s failures",
+                        self.name,
+                        self.failures,
+                    )
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        self._before_call()
+
+        start = time.monotonic()
+        try:
+            rv = fn(*args, **kwargs)
+        except DeadlineExceeded:
+            self._release()
+            raise
+        except Exception as e:
+            if budget_spent():
+                self._release()
+            else:
+                self._record(self.is_failure is not None and not self.is_failure(e))
+            raise
+
+        slow = time.monotonic() - start > self.slow_call_threshold
+        failed = self.is_failure is not None and self.is_failure(rv)
+        self._record(not (slow or failed))
+
+        return rv
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+def is_server_error(outcome):
+    # A response, or the exception raised instead of one. A 4xx means the
+    # dependency is up and rejected the request. Transport errors carry no
+    # status code and count as failures, other results without one don't.
+    status = getattr(outcome, "status_code", None)
+    if status is None:
+        return isinstance(outcome, Exception)
+    return status >= 500
+
+
+breakers = {
+    "redis": CircuitBreaker("redis"),
+    "apple": CircuitBreaker("apple", is_failure=is_server_error),
+    "google": CircuitBreaker("google", is_failure=is_server_error),
+    "traction": CircuitBreaker("traction", is_failure=is_server_error),
+}
+
+
+def guarded(name, fn, *args, **kwargs):
+    # Fail fast once the request budget is spent instead of starting a
+    # call that can't finish in time.
+    timeout()
+    return breakers[name].call(fn, *args, **kwargs)
+
+
+def breaker_states():
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
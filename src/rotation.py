@@ -0,0 +1,33 @@
+"""Append-only files rotated by size, like logging's RotatingFileHandler."""
+
+import os
+
+
+class RotatingFile:
+    """Appends bytes to `name`, keeping up to `backups` rotated files.
+
+    Once the file passes `max_bytes` it is renamed to `name.1`, older
+    files move up by one and the oldest is dropped.
+    """
+
+    def __init__(self, name, max_bytes, backups):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(name, "ab")
+
+    def write(self, data):
+        self.file.write(data)
+        if self.file.tell() > self.max_bytes:
+            self.rotate()
+
+    def flush(self):
+        self.file.flush()
+
+    def rotate(self):
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.name}.{index}"):
+                os.replace(f"{self.name}.{index}", f"{self.name}.{index + 1}")
+        os.replace(self.name, f"{self.name}.1")
+        self.file = open(self.name, "ab")
@@ -0,0 +1,209 @@
+"""Controller settings, loaded once and reloaded without a restart.
+
+Settings come from the environment, overridden by the dotenv style file
+in SETTINGS_PATH when it is set, and are validated as a whole. Modules
+read them from `settings.current` at call time, so a reload is seen by
+the next call.
+
+Each worker reloads when it receives SIGHUP, or when SETTINGS_PATH or a
+file a setting points at, such as the Google credentials or the message
+templates, changes on disk. A new set that fails validation is ignored
+and the previous one kept. Only the clients and caches that depend on a
+changed setting are rebuilt, through the callbacks registered with
+`on_change`; every other warm cache survives the reload.
+
+Settings only used at startup, such as REDIS_URI or the gunicorn
+profile, are still read from the environment where they are used.
+"""
+
+import os
+import signal
+import logging
+import threading
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv, dotenv_values
+from background import start_once
+from constants import settings_poll_interval
+
+logger = logging.getLogger(__name__)
+
+if os.getenv("FLASK_ENV") == "development":
+    load_dotenv()
+
+
+class SettingsError(ValueError):
+    pass
+
+
+class Settings(NamedTuple):
+    traction_base_url: Optional[str]
+    traction_tenant_id: Optional[str]
+    traction_tenant_api_key: Optional[str]
+    traction_legacy_did: Optional[str]
+    attestation_cred_def_tag: Optional[str]
+    message_templates_path: Optional[str]
+    apple_attestation_root_ca_url: Optional[str]
+    google_auth_json_path: Optional[str]
+    play_integrity_endpoint: Optional[str]
+    verdict_policy_path: Optional[str]
+    allow_test_builds: bool
+    debug_token: Optional[str]
+
+
+# Settings naming a file whose contents are cached by the controller, a
+# change to the file counts as a change to the setting.
+watched_files = {
+    "google_auth_json_path": lambda value: value,
+    "message_templates_path": lambda value: os.path.join(value, "offer.json"),
+    "verdict_policy_path": lambda value: value,
+}
+required = ("traction_base_url", "traction_tenant_id", "traction_legacy_did")
+
+
+def parse_bool(name, value):
+    if value is None:
+        return False
+    if value.lower() not in ("true", "false"):
+        raise SettingsError(f"{name} must be true or false, not {value!r}")
+    return value.lower() == "true"
+
+
+def parse_url(name, value):
+    if value is not None and not value.startswith(("http://", "https://")):
+        raise SettingsError(f"{name} must be an http(s) URL, not {value!r}")
+    return value
+
+
+def load():
+    values = dict(os.environ)
+    path = os.getenv("SETTINGS_PATH")
+    if path:
+        values.update(
+            {key: value for key, value in dotenv_values(path).items() if value}
+        )
+
+    def get(name):
+        return values.get(name) or None
+
+    loaded = Settings(
+        traction_base_url=parse_url("TRACTION_BASE_URL", get("TRACTION_BASE_URL")),
+        traction_tenant_id=get("TRACTION_TENANT_ID"),
+        traction_tenant_api_key=get("TRACTION_TENANT_API_KEY"),
+        traction_legacy_did=get("TRACTION_LEGACY_DID"),
+        attestation_cred_def_tag=get("ATTESTATION_CRED_DEF_TAG"),
+        message_templates_path=get("MESSAGE_TEMPLATES_PATH"),
+        apple_attestation_root_ca_url=parse_url(
+            "APPLE_ATTESTATION_ROOT_CA_URL", get("APPLE_ATTESTATION_ROOT_CA_URL")
+        ),
+        google_auth_json_path=get("GOOGLE_AUTH_JSON_PATH"),
+        play_integrity_endpoint=parse_url(
+            "PLAY_INTEGRITY_ENDPOINT", get("PLAY_INTEGRITY_ENDPOINT")
+        ),
+        verdict_policy_path=get("VERDICT_POLICY_PATH"),
+        allow_test_builds=parse_bool("ALLOW_TEST_BUILDS", get("ALLOW_TEST_BUILDS")),
+        debug_token=get("DEBUG_TOKEN"),
+    )
+
+    missing = [name for name in required if getattr(loaded, name) is None]
+    if missing:
+        # Scripts import the controller modules without a full environment,
+        # so this is only reported.
+        logger.warning("Settings missing: %s", ", ".join(missing))
+
+    return loaded
+
+
+current = load()
+
+_callbacks = []
+_mtimes = {}
+_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def on_change(names, callback):
+    """Call `callback(settings)` after a reload that changed any of `names`."""
+    _callbacks.append((frozenset(names), callback))
+
+
+def _watched_paths(loaded):
+    paths = {}
+    if os.getenv("SETTINGS_PATH"):
+        paths["settings"] = os.getenv("SETTINGS_PATH")
+    for name, path_of in watched_files.items():
+        value = getattr(loaded, name)
+        if value:
+            paths[name] = path_of(value)
+    return paths
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _changed_files(loaded):
+    changed = set()
+    for name, path in _watched_paths(loaded).items():
+        mtime = _mtime(path)
+        if _mtimes.get(name, mtime) != mtime:
+            changed.add(name)
+        _mtimes[name] = mtime
+    return changed
+
+
+def reload():
+    """Reload the settings, returning the names of those that changed."""
+    global current
+
+    with _lock:
+        try:
+            loaded = load()
+        except SettingsError as e:
+            logger.warning("Ignoring invalid settings, keeping the current: %s", e)
+            return set()
+
+        changed = {
+            name
+            for name in Settings._fields
+            if getattr(loaded, name) != getattr(current, name)
+        }
+        changed |= _changed_files(loaded) - {"settings"}
+        current = loaded
+
+    if changed:
+        logger.info("Settings changed: %s", ", ".join(sorted(changed)))
+    for names, callback in _callbacks:
+        if names & changed:
+            try:
+                callback(loaded)
+            except Exception as e:
+                logger.warning("Unable to apply settings change: %s", e)
+
+    return changed
+
+
+def _watch_forever():
+    with _lock:
+        _changed_files(current)
+    while True:
+        # Woken early by SIGHUP.
+        _wake.wait(settings_poll_interval)
+        _wake.clear()
+        try:
+            reload()
+        except Exception as e:
+            logger.warning("Unable to reload settings: %s", e)
+
+
+def ensure_watching():
+    start_once("settings-watch", _watch_forever)
+
+
+def install_sighup():
+    # Must be called from the main thread. The reload itself runs on the
+    # watcher thread, not in the signal handler.
+    ensure_watching()
+    signal.signal(signal.SIGHUP, lambda signum, frame: _wake.set())
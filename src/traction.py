@@ -1,20 +1,50 @@
 import requests
-import json
-import os
+import codec
 from urllib.parse import urljoin
-from dotenv import load_dotenv
 import logging
 import jwt
 import datetime
-
-if os.getenv("FLASK_ENV") == "development":
-    load_dotenv()
+from resilience import guarded, timeout
+from constants import traction_pool_workers
+import offers
+import settings
 
 bearer_token = None
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def create_session():
+    # One session shared by every thread, so calls reuse kept-alive
+    # connections rather than doing a new TLS handshake each time. Its
+    # pool holds a connection for each Traction pool thread.
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=traction_pool_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def reset_session():
+    # Called after a fork so workers never share the master's sockets.
+    global session
+    session = create_session()
+
+
+def reset_bearer_token(_):
+    # The token belongs to the tenant it was fetched for.
+    global bearer_token
+    bearer_token = None
+
+
+settings.on_change(
+    ("traction_base_url", "traction_tenant_id", "traction_tenant_api_key"),
+    reset_bearer_token,
+)
+
+
+session = create_session()
+
+
 def is_token_expired(token):
     try:
         # Bypass signature verification since we only need to check the
@@ -33,30 +63,41 @@ def is_token_expired(token):
             return True
     except Exception as e:
         # Handle potential exceptions
-        print(f"An error occurred: {e}")
+        logger.error("Unable to check token expiry: %s", e)
+
+
+def has_bearer_token():
+    return bool(bearer_token) and not is_token_expired(bearer_token)
 
 
 def fetch_bearer_token():
     global bearer_token
 
     if bearer_token and not is_token_expired(bearer_token):
-        logger.info("Found existing unexpired bearer token, returning it")
+        logger.debug("Found existing unexpired bearer token, returning it")
         return bearer_token
 
-    base_url = os.environ.get("TRACTION_BASE_URL")
-    tenant_id = os.environ.get("TRACTION_TENANT_ID")
-    api_key = os.environ.get("TRACTION_TENANT_API_KEY")
+    base_url = settings.current.traction_base_url
+    tenant_id = settings.current.traction_tenant_id
+    api_key = settings.current.traction_tenant_api_key
     endpoint = f"multitenancy/tenant/{tenant_id}/token"
     url = urljoin(base_url, endpoint)
     headers = {"Content-Type": "application/json", "accept": "application/json"}
     data = {"api_key": api_key}
 
-    logger.info(f"Requesting bearer token for walletId {tenant_id}")
+    logger.info("Requesting bearer token for walletId %s", tenant_id)
 
-    response = requests.post(url, headers=headers, data=json.dumps(data))
+    response = guarded(
+        "traction",
+        session.post,
+        url,
+        headers=headers,
+        data=codec.dumps(data),
+        timeout=timeout(),
+    )
     if response.status_code == 200:
         logger.info("Token fetched successfully")
-        response_data = json.loads(response.text)
+        response_data = codec.loads(response.content)
 
         bearer_token = response_data["token"]
         if bearer_token is None:
@@ -64,12 +105,12 @@ def fetch_bearer_token():
 
         return bearer_token
     else:
-        logger.error(f"Error fetching token: {response.status_code}")
-        logger.error(f"Text content for error: {response.text}")
+        logger.error("Error fetching token: %s", response.status_code)
+        logger.error("Text content for error: %s", response.text)
 
 
 def get_connection(conn_id):
-    base_url = os.environ.get("TRACTION_BASE_URL")
+    base_url = settings.current.traction_base_url
     endpoint = f"/connections/{conn_id}"
     url = urljoin(base_url, endpoint)
 
@@ -81,16 +122,16 @@ def get_connection(conn_id):
         "Authorization": f"Bearer {token}",
     }
 
-    logger.info(f"Fetching connection {conn_id}")
+    logger.info("Fetching connection %s", conn_id)
 
-    response = requests.get(url, headers=headers)
+    response = guarded("traction", session.get, url, headers=headers, timeout=timeout())
 
     if response.status_code == 200:
         logger.info("Connection fetched successfully")
-        return json.loads(response.text)
+        return codec.loads(response.content)
     else:
-        logger.error(f"Error fetching connection message: {response.status_code}")
-        logger.error(f"Text content for error: {response.text}")
+        logger.error("Error fetching connection message: %s", response.status_code)
+        logger.error("Text content for error: %s", response.text)
 
     return None
 
@@ -98,7 +139,7 @@ def get_connection(conn_id):
 def send_drpc_response(conn_id, thread_id, response):
     endpoint = f"/drpc/{conn_id}/response"
     message = {"response": response, "thread_id": thread_id}
-    print(f"Sending response to {conn_id}, message = {message}")
+    logger.debug("Sending response to %s, message = %s", conn_id, message)
 
     send_generic_message(conn_id, endpoint, message)
 
@@ -112,7 +153,7 @@ def send_drpc_request(conn_id, request):
 
 
 def send_generic_message(conn_id, endpoint, message):
-    base_url = os.environ.get("TRACTION_BASE_URL")
+    base_url = settings.current.traction_base_url
     url = urljoin(base_url, endpoint)
 
     token = fetch_bearer_token()
@@ -123,20 +164,29 @@ def send_generic_message(conn_id, endpoint, message):
         "Authorization": f"Bearer {token}",
     }
 
-    logger.info(f"Sending message to {conn_id}, message = {endpoint}")
+    logger.info("Sending message to %s, message = %s", conn_id, endpoint)
 
-    response = requests.post(url, headers=headers, data=json.dumps(message))
+    response = guarded(
+        "traction",
+        session.post,
+        url,
+        headers=headers,
+        data=codec.dumps(message),
+        timeout=timeout(),
+    )
 
     if response.status_code == 200:
         logger.info("Message sent successfully")
     else:
-        logger.error(f"Error sending message: {response.status_code} {response.text}")
+        logger.error(
+            "Error sending message: %s %s", response.status_code, response.text
+        )
 
 
 def offer_attestation_credential(offer):
     logger.info("issue_attestation_credential")
 
-    base_url = os.environ.get("TRACTION_BASE_URL")
+    base_url = settings.current.traction_base_url
     endpoint = "/issue-credential/send-offer"
     url = urljoin(base_url, endpoint)
 
@@ -148,21 +198,32 @@ def offer_attestation_credential(offer):
         "Authorization": f"Bearer {token}",
     }
 
-    logger.info(f"Sending offer to {offer['connection_id']}, offer = {offer}")
+    logger.info(
+        "Sending offer to %s, cred def %s", offer["connection_id"], offer["cred_def_id"]
+    )
+    logger.debug("Offer: %s", offer)
 
-    response = requests.post(url, headers=headers, data=json.dumps(offer))
+    response = guarded(
+        "traction",
+        session.post,
+        url,
+        headers=headers,
+        data=codec.dumps(offer),
+        timeout=timeout(),
+    )
 
     if response.status_code == 200:
         logger.info("Offer sent successfully")
+        offers.offer_sent(offer["connection_id"], offer["cred_def_id"])
     else:
-        logger.error(f"Error sending offer: {response.status_code}")
-        logger.error(f"Text content for error: {response.text}")
+        logger.error("Error sending offer: %s", response.status_code)
+        logger.error("Text content for error: %s", response.text)
 
 
 def get_schema(schema_id):
     logger.info("get_schema")
 
-    base_url = os.environ.get("TRACTION_BASE_URL")
+    base_url = settings.current.traction_base_url
     endpoint = "/schemas/created"
     url = urljoin(base_url, endpoint)
 
@@ -174,21 +235,28 @@ def get_schema(schema_id):
         "Authorization": f"Bearer {token}",
     }
 
-    response = requests.get(url, headers=headers, params={"schema_id": schema_id})
+    response = guarded(
+        "traction",
+        session.get,
+        url,
+        headers=headers,
+        params={"schema_id": schema_id},
+        timeout=timeout(),
+    )
 
     if response.status_code == 200:
         logger.info("Schema queried successfully")
     else:
-        logger.error(f"Error querying schema: {response.status_code}")
-        logger.error(f"Text content for error: {response.text}")
+        logger.error("Error querying schema: %s", response.status_code)
+        logger.error("Text content for error: %s", response.text)
 
-    return response.json()
+    return codec.loads(response.content)
 
 
 def get_cred_def(schema_id):
     logger.info("get_cred_def")
 
-    base_url = os.environ.get("TRACTION_BASE_URL")
+    base_url = settings.current.traction_base_url
     endpoint = "/credential-definitions/created"
     url = urljoin(base_url, endpoint)
 
@@ -200,21 +268,28 @@ def get_cred_def(schema_id):
         "Authorization": f"Bearer {token}",
     }
 
-    response = requests.get(url, headers=headers, params={"schema_id": schema_id})
+    response = guarded(
+        "traction",
+        session.get,
+        url,
+        headers=headers,
+        params={"schema_id": schema_id},
+        timeout=timeout(),
+    )
 
     if response.status_code == 200:
         logger.info("Cred def queried successfully")
     else:
-        logger.error(f"Error querying cred def: {response.status_code}")
-        logger.error(f"Text content for error: {response.text}")
+        logger.error("Error querying cred def: %s", response.status_code)
+        logger.error("Text content for error: %s", response.text)
 
-    return response.json()
+    return codec.loads(response.content)
 
 
 def create_schema(schema_name, schema_version, attributes):
     logger.info("create_schema")
 
-    base_url = os.environ.get("TRACTION_BASE_URL")
+    base_url = settings.current.traction_base_url
     endpoint = "/schemas"
     url = urljoin(base_url, endpoint)
 
@@ -232,21 +307,28 @@ def create_schema(schema_name, schema_version, attributes):
         "attributes": attributes,
     }
 
-    response = requests.post(url, headers=headers, data=json.dumps(schema))
+    response = guarded(
+        "traction",
+        session.post,
+        url,
+        headers=headers,
+        data=codec.dumps(schema),
+        timeout=timeout(),
+    )
 
     if response.status_code == 200:
         logger.info("Schema created successfully")
     else:
-        logger.error(f"Error creating schema: {response.status_code}")
-        logger.error(f"Text content for error: {response.text}")
+        logger.error("Error creating schema: %s", response.status_code)
+        logger.error("Text content for error: %s", response.text)
 
-    return response.json()
+    return codec.loads(response.content)
 
 
 def create_cred_def(schema_id, tag, revocation_registry_size=0):
     logger.info("create_cred_def")
 
-    base_url = os.environ.get("TRACTION_BASE_URL")
+    base_url = settings.current.traction_base_url
     endpoint = "/credential-definitions"
     url = urljoin(base_url, endpoint)
 
@@ -268,14 +350,21 @@ def create_cred_def(schema_id, tag, revocation_registry_size=0):
         payload["revocation_registry_size"] = revocation_registry_size
 
     # print(payload)
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = guarded(
+        "traction",
+        session.post,
+        url,
+        headers=headers,
+        data=codec.dumps(payload),
+        timeout=timeout(),
+    )
 
     if response.status_code == 200:
         logger.info("Request sent successfully")
-        return response.json()
+        return codec.loads(response.content)
     else:
-        logger.error(f"Error creating request: {response.status_code}")
-        logger.error(f"Text content for error: {response.text}")
+        logger.error("Error creating request: %s", response.status_code)
+        logger.error("Text content for error: %s", response.text)
 
     return None
 
@@ -283,7 +372,7 @@ def create_cred_def(schema_id, tag, revocation_registry_size=0):
 def create_presentation_request(presentation_data):
     logger.info("create_presentation_request")
 
-    base_url = os.environ.get("TRACTION_BASE_URL")
+    base_url = settings.current.traction_base_url
     endpoint = "/present-proof-2.0/create-request"
     url = urljoin(base_url, endpoint)
 
@@ -295,22 +384,29 @@ def create_presentation_request(presentation_data):
         "Authorization": f"Bearer {token}",
     }
 
-    logger.info(f"Creating presentation request = {presentation_data}")
+    logger.info("Creating presentation request = %s", presentation_data)
 
-    response = requests.post(url, headers=headers, data=json.dumps(presentation_data))
+    response = guarded(
+        "traction",
+        session.post,
+        url,
+        headers=headers,
+        data=codec.dumps(presentation_data),
+        timeout=timeout(),
+    )
 
     if response.status_code == 200:
         logger.info("Request creation successfully")
-        return response.json()
+        return codec.loads(response.content)
     else:
-        logger.error(f"Error creating request: {response.status_code}")
-        logger.error(f"Text content for error: {response.text}")
+        logger.error("Error creating request: %s", response.status_code)
+        logger.error("Text content for error: %s", response.text)
 
 
 def send_presentation_request(request):
     logger.info("send_presentation_request")
 
-    base_url = os.environ.get("TRACTION_BASE_URL")
+    base_url = settings.current.traction_base_url
     endpoint = "/present-proof-2.0/send-request"
     url = urljoin(base_url, endpoint)
 
@@ -322,13 +418,20 @@ def send_presentation_request(request):
         "Authorization": f"Bearer {token}",
     }
 
-    logger.info(f"Sending presentation request = {request}")
+    logger.info("Sending presentation request = %s", request)
 
-    response = requests.post(url, headers=headers, data=json.dumps(request))
+    response = guarded(
+        "traction",
+        session.post,
+        url,
+        headers=headers,
+        data=codec.dumps(request),
+        timeout=timeout(),
+    )
 
     if response.status_code == 200:
         logger.info("Request sent successfully")
-        return response.json()
+        return codec.loads(response.content)
     else:
-        logger.error(f"Error sending request: {response.status_code}")
-        logger.error(f"Text content for error: {response.text}")
+        logger.error("Error sending request: %s", response.status_code)
+        logger.error("Text content for error: %s", response.text)
@@ -0,0 +1,101 @@
+"""Short-lived cache of decoded Play Integrity verdicts.
+
+Wallet retries and webhook redeliveries send the same integrity token
+more than once while its nonce is valid. Each decoded verdict is kept for
+`verdict_cache_ttl` seconds, keyed by the package name and the SHA-256 of
+the token, so a repeat doesn't cost another Google call. The verdict is
+still checked against the current nonce by the caller.
+
+Every worker keeps a small LRU of verdicts. With VERDICT_CACHE_REDIS set
+to `true`, verdicts are also shared through Redis, so a repeat answered
+by another worker or pod is found as well.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import codec
+from redis_config import redis_instance
+from resilience import guarded
+from metrics import verdict_cache
+from constants import verdict_cache_size, verdict_cache_ttl, verdict_key_prefix
+
+logger = logging.getLogger(__name__)
+
+
+class VerdictCache:
+    def __init__(self, size, ttl, use_redis):
+        self.size = size
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(package_name, token):
+        digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        return f"{package_name}:{digest}"
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, verdict = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return verdict
+
+    def _put_local(self, key, verdict, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, verdict)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        verdict = self._get_local(key)
+        if verdict is not None:
+            verdict_cache.labels("local_hit").inc()
+            return verdict
+
+        if self.use_redis:
+            try:
+                stored = guarded("redis", redis_instance.get, verdict_key_prefix + key)
+            except Exception as e:
+                logger.info("Unable to read cached verdict: %s", e)
+                stored = None
+            if stored:
+                verdict = codec.loads(stored)
+                self._put_local(key, verdict, self.ttl)
+                verdict_cache.labels("redis_hit").inc()
+                return verdict
+
+        verdict_cache.labels("miss").inc()
+        return None
+
+    def put(self, key, verdict):
+        self._put_local(key, verdict, self.ttl)
+        if self.use_redis:
+            try:
+                guarded(
+                    "redis",
+                    redis_instance.setex,
+                    verdict_key_prefix + key,
+                    self.ttl,
+                    codec.dumps(verdict),
+                )
+            except Exception as e:
+                logger.info("Unable to share cached verdict: %s", e)
+
+
+cache = VerdictCache(
+    verdict_cache_size,
+    verdict_cache_ttl,
+    os.getenv("VERDICT_CACHE_REDIS", "false") == "true",
+)
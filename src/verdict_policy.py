@@ -0,0 +1,203 @@
+"""Declarative Play Integrity verdict policies.
+
+Each app's policy is `default_verdict_policy` from constants, overridden
+by the JSON file in VERDICT_POLICY_PATH and then by the app's own
+`verdict_policy` in the app registry, for example:
+
+    {
+        "device_verdicts": ["MEETS_STRONG_INTEGRITY"],
+        "min_version_code": 1200,
+        "certificate_digests": ["6a6a1474b5cbbb2b1aa57e0bc3"],
+        "max_age_seconds": 600
+    }
+
+Rules are the named predicates in `rules`, and a policy only picks
+which of them apply and their parameters, a rule whose parameter is null
+or empty is skipped. Each app's rules are built once, cheapest first, so
+a verdict is rejected by the first rule it fails without evaluating the
+rest. Rejections are counted per app and rule in
+`controller_verdict_rejections_total`.
+
+Policies are rebuilt when the file in VERDICT_POLICY_PATH or
+ALLOW_TEST_BUILDS changes, see settings.py. A policy that fails to
+build is logged and the previous policies are kept.
+"""
+
+import time
+import logging
+import codec
+import settings
+from apps import registry as app_registry
+from metrics import verdict_rejections
+from constants import default_verdict_policy
+
+logger = logging.getLogger(__name__)
+
+
+# Each rule builds a predicate over the token payload and the expected
+# nonce from the app and its policy, or returns None when the policy
+# doesn't ask for it.
+def nonce_rule(app, policy):
+    def check(payload, nonce):
+        return payload["requestDetails"]["nonce"] == nonce
+
+    return check
+
+
+def package_rule(app, policy):
+    package = app.android_package
+
+    def check(payload, nonce):
+        return (
+            payload["requestDetails"]["requestPackageName"] == package
+            and payload["appIntegrity"]["packageName"] == package
+        )
+
+    return check
+
+
+def app_verdict_rule(app, policy):
+    if app.allow_test_builds:
+        return None
+    app_verdicts = frozenset(policy["app_verdicts"])
+
+    def check(payload, nonce):
+        return payload["appIntegrity"]["appRecognitionVerdict"] in app_verdicts
+
+    return check
+
+
+def version_code_rule(app, policy):
+    min_version_code = policy["min_version_code"]
+    if min_version_code is None:
+        return None
+
+    def check(payload, nonce):
+        return int(payload["appIntegrity"].get("versionCode", 0)) >= min_version_code
+
+    return check
+
+
+def licensing_rule(app, policy):
+    if not policy["licensing_verdicts"]:
+        return None
+    licensing_verdicts = frozenset(policy["licensing_verdicts"])
+
+    def check(payload, nonce):
+        account = payload.get("accountDetails", {})
+        return account.get("appLicensingVerdict") in licensing_verdicts
+
+    return check
+
+
+def device_verdict_rule(app, policy):
+    if not policy["device_verdicts"]:
+        return None
+    device_verdicts = frozenset(policy["device_verdicts"])
+
+    def check(payload, nonce):
+        return device_verdicts.issubset(
+            payload["deviceIntegrity"].get("deviceRecognitionVerdict", ())
+        )
+
+    return check
+
+
+def freshness_rule(app, policy):
+    if policy["max_age_seconds"] is None:
+        return None
+    max_age_millis = policy["max_age_seconds"] * 1000
+
+    def check(payload, nonce):
+        requested = int(payload["requestDetails"]["timestampMillis"])
+        return time.time() * 1000 - requested <= max_age_millis
+
+    return check
+
+
+def certificate_rule(app, policy):
+    if not policy["certificate_digests"]:
+        return None
+    certificate_digests = frozenset(policy["certificate_digests"])
+
+    def check(payload, nonce):
+        return not certificate_digests.isdisjoint(
+            payload["appIntegrity"].get("certificateSha256Digest", ())
+        )
+
+    return check
+
+
+# Cheapest first, each with the rule that builds its predicate.
+rules = {
+    "nonce": nonce_rule,
+    "package": package_rule,
+    "app_verdict": app_verdict_rule,
+    "version_code": version_code_rule,
+    "licensing": licensing_rule,
+    "device_verdict": device_verdict_rule,
+    "freshness": freshness_rule,
+    "certificate": certificate_rule,
+}
+
+
+class VerdictPolicy:
+    """The predicates of an app's verdict policy, cheapest first."""
+
+    def __init__(self, app, policy):
+        unknown = set(policy) - set(default_verdict_policy)
+        if unknown:
+            raise ValueError(f"unknown verdict policy rules: {', '.join(unknown)}")
+
+        self.checks = []
+        for name, rule in rules.items():
+            check = rule(app, policy)
+            if check is not None:
+                self.checks.append((name, check))
+        # Label lookups are done once here rather than per rejection.
+        self.rejections = {
+            name: verdict_rejections.labels(app.name, name)
+            for name in [name for name, _ in self.checks] + ["malformed"]
+        }
+
+    def evaluate(self, payload, nonce):
+        try:
+            for name, check in self.checks:
+                if not check(payload, nonce):
+                    self.rejections[name].inc()
+                    logger.info("Verdict rejected by rule %s", name)
+                    return False
+        except (KeyError, TypeError, ValueError) as e:
+            self.rejections["malformed"].inc()
+            logger.info("Malformed verdict: %s", e)
+            return False
+
+        return True
+
+
+def compile_policies():
+    base = dict(default_verdict_policy)
+    path = settings.current.verdict_policy_path
+    if path:
+        # Not through codec.load_file, which caches the file for good.
+        with open(path, "rb") as f:
+            base.update(codec.loads(f.read()))
+
+    return {
+        app.name: VerdictPolicy(app, {**base, **app.verdict_policy})
+        for app in app_registry.by_name.values()
+        if app.android_package is not None
+    }
+
+
+policies = compile_policies()
+
+
+def reload_policies(_):
+    # Replaced whole, so a verdict is never checked against a partial set.
+    global policies
+    policies = compile_policies()
+    logger.info("Rebuilt verdict policies for %s apps", len(policies))
+
+
+settings.on_change(("verdict_policy_path", "allow_test_builds"), reload_policies)
@@ -0,0 +1,49 @@
+import os
+import importlib
+from redis_config import redis_instance
+
+warm_up_enabled = os.getenv("WARM_UP", "true") == "true"
+
+# Outcome of each warm-up stage, reported by the readiness checks.
+warm_state = {}
+
+
+def warm_redis():
+    redis_instance.ping()
+
+
+def warm_apple():
+    apple = importlib.import_module("apple")
+    apple.fetch_apple_attestation_root_ca_cert()
+
+
+def warm_google():
+    goog = importlib.import_module("goog")
+    goog.get_integrity_service()
+
+
+def warm_traction():
+    traction = importlib.import_module("traction")
+    if traction.fetch_bearer_token() is None:
+        raise RuntimeError("no bearer token")
+
+
+def warm_cred_defs():
+    cred_defs = importlib.import_module("cred_defs")
+    cred_defs.registry.ensure_discovered()
+
+
+stages = {
+    "redis": warm_redis,
+    "apple": warm_apple,
+    "google": warm_google,
+    "traction": warm_traction,
+    "cred_defs": warm_cred_defs,
+}
+
+
+def warm_imports():
+    # Nothing here calls out, so it is safe in the gunicorn master before
+    # it binds, and the workers share the loaded modules copy-on-write.
+    for name in ("apple", "goog", "traction", "cred_defs"):
+        importlib.import_module(name)
@@ -0,0 +1,67 @@
+import base64
+import hashlib
+import cbor2
+import pytest
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+import apple
+from apps import registry as app_registry
+
+app = app_registry.default
+key = ec.generate_private_key(ec.SECP256R1())
+public_key = key.public_key().public_bytes(
+    serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+)
+
+
+def make_assertion(counter, nonce, rp_id_hash=None, signing_key=key):
+    auth_data = (rp_id_hash or app.rp_id_hash) + b"\x40" + counter.to_bytes(4, "big")
+    client_data_hash = hashlib.sha256(nonce.encode()).digest()
+    composite = hashlib.sha256(auth_data + client_data_hash).digest()
+    signature = signing_key.sign(composite, ec.ECDSA(hashes.SHA256()))
+    statement = {"signature": signature, "authenticatorData": auth_data}
+    return base64.b64encode(cbor2.dumps(statement)).decode()
+
+
+def test_accepts_a_fresh_assertion():
+    assertion = make_assertion(5, "nonce")
+    assert apple.verify_assertion(assertion, public_key, 4, "nonce", app) == 5
+
+
+@pytest.mark.parametrize("stored", [5, 6])
+def test_rejects_a_replayed_or_older_counter(stored):
+    assertion = make_assertion(5, "nonce")
+    assert apple.verify_assertion(assertion, public_key, stored, "nonce", app) is None
+
+
+def test_rejects_a_zero_counter_on_first_use():
+    assertion = make_assertion(0, "nonce")
+    assert apple.verify_assertion(assertion, public_key, 0, "nonce", app) is None
+
+
+def test_rejects_the_wrong_nonce():
+    assertion = make_assertion(5, "nonce")
+    assert apple.verify_assertion(assertion, public_key, 0, "other", app) is None
+
+
+def test_rejects_another_key():
+    assertion = make_assertion(
+        5, "nonce", signing_key=ec.generate_private_key(ec.SECP256R1())
+    )
+    assert apple.verify_assertion(assertion, public_key, 0, "nonce", app) is None
+
+
+def test_rejects_another_app():
+    assertion = make_assertion(5, "nonce", rp_id_hash=hashlib.sha256(b"x").digest())
+    assert apple.verify_assertion(assertion, public_key, 0, "nonce", app) is None
+
+
+def test_attested_app_is_found_without_copying_auth_data():
+    auth_data = memoryview(app.rp_id_hash + b"\x40" + bytes(4))
+    assert app_registry.for_rp_id_hash(auth_data[:32]) is app
+    assert apple.attested_app({"authData": auth_data.obj}) is app
+
+
+def test_rejects_malformed_cbor():
+    assertion = base64.b64encode(b"\x9f\x00\xff").decode()
+    assert apple.verify_assertion(assertion, public_key, 0, "nonce", app) is None
@@ -0,0 +1,53 @@
+import os
+import uuid
+import pytest
+import redis
+from redis_scripts import update_assertion_counter_script
+
+# The script runs inside Redis, so these need a real server, e.g.
+# REDIS_TEST_URI=redis://localhost:6379/0
+redis_uri = os.environ.get("REDIS_TEST_URI")
+if not redis_uri:
+    pytest.skip("REDIS_TEST_URI is not set", allow_module_level=True)
+
+
+@pytest.fixture
+def client():
+    client = redis.Redis.from_url(redis_uri)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def key(client):
+    key = f"test-assertion:{uuid.uuid4()}"
+    yield key
+    client.delete(key)
+
+
+def update(client, key, counter):
+    return client.eval(update_assertion_counter_script, 1, key, counter, 60)
+
+
+def test_advances_a_higher_counter_and_keeps_the_key(client, key):
+    client.set(key, "4:a2V5:bc-wallet")
+    assert update(client, key, 5) == 1
+    assert client.get(key) == b"5:a2V5:bc-wallet"
+    assert 0 < client.ttl(key) <= 60
+
+
+@pytest.mark.parametrize("counter", [4, 3])
+def test_rejects_a_replayed_or_lower_counter(client, key, counter):
+    client.set(key, "4:a2V5:bc-wallet")
+    assert update(client, key, counter) == 0
+    assert client.get(key) == b"4:a2V5:bc-wallet"
+
+
+def test_only_one_of_two_equal_counters_wins(client, key):
+    client.set(key, "4:a2V5:bc-wallet")
+    assert [update(client, key, 5), update(client, key, 5)] == [1, 0]
+
+
+def test_rejects_a_missing_key(client, key):
+    assert update(client, key, 5) == 0
+    assert client.get(key) is None
@@ -0,0 +1,40 @@
+import os
+import threading
+import background
+
+
+def test_setup_runs_once_per_process():
+    calls = []
+
+    assert background.once_per_process("test-once", lambda: calls.append(1))
+    assert not background.once_per_process("test-once", lambda: calls.append(2))
+    assert calls == [1]
+    assert background.running("test-once")
+
+
+def test_start_once_starts_one_named_thread():
+    started = threading.Event()
+    names = []
+
+    def target():
+        names.append(threading.current_thread().name)
+        started.set()
+
+    background.start_once("test-thread", target)
+    background.start_once("test-thread", target)
+    assert started.wait(5)
+    assert names == ["test-thread"]
+
+
+def test_setup_runs_again_after_a_fork():
+    background.once_per_process("test-fork", lambda: None)
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ran = background.once_per_process("test-fork", lambda: None)
+        os.write(write, b"1" if ran else b"0")
+        os._exit(0)
+
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b"1"
+    assert background.running("test-fork")
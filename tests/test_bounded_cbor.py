@@ -0,0 +1,69 @@
+import cbor2
+import pytest
+import bounded_cbor
+from bounded_cbor import CBORLimitError
+
+
+def loads(data):
+    return bounded_cbor.loads(data, max_size=1024, max_items=32, max_depth=4)
+
+
+def test_accepts_an_attestation_shaped_map():
+    value = {"fmt": "apple-appattest", "attStmt": {"x5c": [b"a", b"b"]}}
+    assert loads(cbor2.dumps(value)) == value
+
+
+def test_rejects_nesting_past_the_limit():
+    with pytest.raises(CBORLimitError, match="nested"):
+        loads(b"\x81" * 5 + b"\x00")
+
+
+def test_accepts_nesting_at_the_limit():
+    assert loads(b"\x81" * 4 + b"\x00") == [[[[0]]]]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x9f\x00\xff",  # indefinite length array
+        b"\xbf\x61a\x00\xff",  # indefinite length map
+        b"\x5f\x41a\xff",  # indefinite length byte string
+    ],
+)
+def test_rejects_indefinite_lengths(data):
+    with pytest.raises(CBORLimitError, match="additional info 31"):
+        loads(data)
+
+
+def test_rejects_trailing_data():
+    with pytest.raises(CBORLimitError, match="trailing"):
+        loads(cbor2.dumps({"a": 1}) + b"\x00")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x5a\xff\xff\xff\x00" + b"a" * 16,  # byte string longer than the input
+        b"\x83\x00\x00",  # array missing an item
+        b"\x19\x01",  # integer missing a byte
+    ],
+)
+def test_rejects_truncated_input(data):
+    with pytest.raises(CBORLimitError):
+        loads(data)
+
+
+def test_rejects_too_many_items():
+    with pytest.raises(CBORLimitError, match="items"):
+        loads(cbor2.dumps(list(range(40))))
+
+
+def test_rejects_a_count_claiming_more_items_than_allowed():
+    # Rejected from the header alone, before any of the items is read.
+    with pytest.raises(CBORLimitError, match="items"):
+        loads(b"\x9a\xff\xff\xff\xff")
+
+
+def test_rejects_oversized_input():
+    with pytest.raises(CBORLimitError, match="larger"):
+        loads(cbor2.dumps(b"a" * 2048))
@@ -0,0 +1,95 @@
+import threading
+import time
+import pytest
+import controller
+
+calls = []
+_lock = threading.Lock()
+
+
+def record(name):
+    with _lock:
+        calls.append(name)
+
+
+def handle_echo(drpc_request, connection_id):
+    # Sleeps for its delay param, so later calls can finish first.
+    time.sleep(drpc_request["params"].get("delay", 0))
+    record(drpc_request["params"]["name"])
+    return {
+        "jsonrpc": "2.0",
+        "result": drpc_request["params"],
+        "id": drpc_request.get("id"),
+    }
+
+
+def handle_nonce(drpc_request, connection_id):
+    record("nonce")
+    return {"jsonrpc": "2.0", "result": {"nonce": "n"}, "id": drpc_request.get("id")}
+
+
+@pytest.fixture(autouse=True)
+def handlers(monkeypatch):
+    calls.clear()
+    monkeypatch.setitem(controller.drpc_request_handlers, "echo", handle_echo)
+    monkeypatch.setitem(
+        controller.drpc_request_handlers, "request_nonce_v2", handle_nonce
+    )
+
+
+def echo(name, id=None, delay=0):
+    call = {
+        "jsonrpc": "2.0",
+        "method": "echo",
+        "params": {"name": name, "delay": delay},
+    }
+    if id is not None:
+        call["id"] = id
+    return call
+
+
+def batch(calls):
+    return controller.handle_drpc_batch(calls, "connection")
+
+
+def test_responses_keep_the_order_of_the_calls():
+    responses = batch([echo("slow", 1, delay=0.2), echo("fast", 2), echo("third", 3)])
+
+    assert [response["id"] for response in responses] == [1, 2, 3]
+    assert calls.index("fast") < calls.index("slow")
+
+
+def test_notifications_are_run_but_not_answered():
+    responses = batch([echo("call", 1), echo("notification"), echo("other", 2)])
+
+    assert [response["id"] for response in responses] == [1, 2]
+    assert sorted(calls) == ["call", "notification", "other"]
+
+
+def test_a_batch_of_notifications_has_no_responses():
+    assert batch([echo("a"), echo("b")]) == []
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_nonce_issuing_drpc_requestsrun_last():
+    nonce = {"jsonrpc": "2.0", "method": "request_nonce_v2", "id": 1}
+    responses = batch([nonce, echo("a", 2, delay=0.1), echo("b", 3)])
+
+    assert calls[-1] == "nonce"
+    assert [response["id"] for response in responses] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("drpc_requests", [[], [echo("a", i) for i in range(11)]])
+def test_an_empty_or_oversized_batch_is_an_invalid_request(drpc_requests):
+    response = batch(drpc_requests)
+
+    assert response["error"]["code"] == 32600
+    assert response["id"] is None
+    assert calls == []
+
+
+def test_an_entry_that_is_not_a_call_is_an_invalid_request():
+    responses = batch([echo("a", 1), 42, {"id": 3}])
+
+    assert responses[0]["id"] == 1
+    assert [response["error"]["code"] for response in responses[1:]] == [32600, 32600]
@@ -0,0 +1,93 @@
+import threading
+import pytest
+from executors import BoundedExecutor, PoolSaturated, wait
+from resilience import DeadlineExceeded, deadline, remaining
+
+
+class Blocker:
+    """Work that holds its pool thread until released."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self):
+        self.started.set()
+        self.released.wait(5)
+
+
+@pytest.fixture
+def blocker():
+    blocker = Blocker()
+    yield blocker
+    blocker.released.set()
+
+
+@pytest.fixture
+def pool():
+    pool = BoundedExecutor("test", max_workers=1, max_queue=1)
+    yield pool
+    pool._executor.shutdown(wait=True)
+
+
+def fill(pool, blocker):
+    # One call running on the worker and one waiting in the queue.
+    running = pool.submit(blocker)
+    blocker.started.wait(5)
+    queued = pool.submit(lambda: "queued")
+    return running, queued
+
+
+def test_rejects_work_when_full(pool, blocker):
+    fill(pool, blocker)
+    with pytest.raises(PoolSaturated):
+        pool.submit(lambda: None)
+
+    stats = pool.saturation()
+    assert (stats["active"], stats["pending"], stats["rejected"]) == (1, 1, 1)
+    assert stats["utilization"] == 1.0
+
+
+def test_cancelling_queued_work_frees_its_slot(pool, blocker):
+    running, queued = fill(pool, blocker)
+    pool.cancel(queued)
+
+    assert queued.cancelled()
+    assert pool.saturation()["pending"] == 0
+    # Accepted while the first call still holds the worker.
+    following = pool.submit(lambda: "following")
+    blocker.released.set()
+    assert wait(following) == "following"
+    assert pool.saturation()["rejected"] == 0
+
+
+def test_cancelling_running_work_lets_it_finish(pool, blocker):
+    running, queued = fill(pool, blocker)
+    pool.cancel(running)
+
+    assert not running.cancelled()
+    blocker.released.set()
+    assert wait(queued) == "queued"
+    assert pool.saturation()["completed"] == 2
+
+
+def test_completed_work_frees_its_slot(pool):
+    for value in range(5):
+        assert pool.run(lambda: value) == value
+
+    stats = pool.saturation()
+    assert (stats["active"], stats["pending"], stats["completed"]) == (0, 0, 5)
+
+
+def test_work_runs_within_the_submitters_deadline(pool):
+    with deadline(5):
+        left = pool.run(remaining)
+    assert 0 < left <= 5
+    assert pool.run(remaining) is None
+
+
+def test_waiting_stops_at_the_deadline(pool, blocker):
+    running = pool.submit(blocker)
+    with deadline(0.05):
+        with pytest.raises(DeadlineExceeded):
+            wait(running)
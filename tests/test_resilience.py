@@ -0,0 +1,160 @@
+import socket
+import time
+import httplib2
+import pytest
+import requests
+from googleapiclient.errors import HttpError
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    deadline,
+    guarded,
+    is_server_error,
+    timeout,
+)
+
+
+def fail(error=RuntimeError("down")):
+    raise error
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"{}")
+
+
+def trip(breaker, error=RuntimeError("down")):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(type(error)):
+            breaker.call(fail, error)
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+    trip(breaker)
+    assert breaker.snapshot() == {
+        "state": "open",
+        "failures": 3,
+        "trips": 1,
+        "rejected": 0,
+    }
+
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "ok")
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_a_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=3)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.snapshot()["failures"] == 0
+
+
+def test_half_open_trial_closes_on_success():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    trip(breaker)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.snapshot()["state"] == "closed"
+
+
+def test_half_open_trial_reopens_on_failure():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0)
+    trip(breaker)
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.snapshot()["state"] == "open"
+    assert breaker.snapshot()["trips"] == 2
+
+
+def test_half_open_rejects_calls_while_the_trial_runs():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    trip(breaker)
+
+    def nested():
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: "ok")
+        return "trial"
+
+    assert breaker.call(nested) == "trial"
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("test", failure_threshold=1, slow_call_threshold=0)
+    breaker.call(time.sleep, 0.001)
+    assert breaker.snapshot()["state"] == "open"
+
+
+@pytest.mark.parametrize("status, failed", [(400, False), (429, False), (503, True)])
+def test_google_errors_count_only_server_errors(status, failed):
+    breaker = CircuitBreaker("google", failure_threshold=1, is_failure=is_server_error)
+    with pytest.raises(HttpError):
+        breaker.call(fail, http_error(status))
+    assert (breaker.snapshot()["state"] == "open") is failed
+
+
+def test_google_results_are_not_failures():
+    breaker = CircuitBreaker("google", failure_threshold=1, is_failure=is_server_error)
+    assert breaker.call(lambda: {"tokenPayloadExternal": {}})
+    assert breaker.snapshot()["state"] == "closed"
+
+
+@pytest.mark.parametrize("status, failed", [(404, False), (502, True)])
+def test_responses_count_only_server_errors(status, failed):
+    breaker = CircuitBreaker("apple", failure_threshold=1, is_failure=is_server_error)
+    response = requests.Response()
+    response.status_code = status
+    assert breaker.call(lambda: response) is response
+    assert (breaker.snapshot()["state"] == "open") is failed
+
+
+def test_transport_errors_count_as_failures():
+    breaker = CircuitBreaker("google", failure_threshold=1, is_failure=is_server_error)
+    trip(breaker, socket.timeout("timed out"))
+    assert breaker.snapshot()["state"] == "open"
+
+
+def test_an_exceeded_deadline_fails_fast():
+    with deadline(0):
+        with pytest.raises(DeadlineExceeded):
+            timeout()
+
+
+def test_an_exceeded_deadline_is_not_a_failure():
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    with pytest.raises(DeadlineExceeded):
+        breaker.call(fail, DeadlineExceeded("request deadline exceeded"))
+    assert breaker.snapshot()["failures"] == 0
+
+
+def test_a_timeout_cut_short_by_the_deadline_is_not_a_failure():
+    breaker = CircuitBreaker("test", failure_threshold=1)
+
+    def read_until_the_deadline():
+        time.sleep(timeout())
+        raise socket.timeout("timed out")
+
+    with deadline(0.01):
+        with pytest.raises(socket.timeout):
+            breaker.call(read_until_the_deadline)
+    assert breaker.snapshot()["state"] == "closed"
+    assert breaker.snapshot()["failures"] == 0
+
+
+def test_a_half_open_trial_out_of_time_lets_the_next_call_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    trip(breaker)
+    with pytest.raises(DeadlineExceeded):
+        breaker.call(fail, DeadlineExceeded("request deadline exceeded"))
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.snapshot()["state"] == "closed"
+
+
+def test_guarded_does_not_start_a_call_past_the_deadline():
+    calls = []
+    with deadline(0):
+        with pytest.raises(DeadlineExceeded):
+            guarded("redis", calls.append, "get")
+    assert calls == []
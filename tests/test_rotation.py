@@ -0,0 +1,24 @@
+from rotation import RotatingFile
+
+
+def test_rotates_past_max_bytes_and_keeps_the_backups(tmp_path):
+    name = tmp_path / "records.jsonl"
+    f = RotatingFile(str(name), max_bytes=10, backups=2)
+    for line in [b"first line\n", b"second line\n", b"third line\n", b"fourth\n"]:
+        f.write(line)
+    f.flush()
+
+    assert name.read_bytes() == b"fourth\n"
+    assert (tmp_path / "records.jsonl.1").read_bytes() == b"third line\n"
+    assert (tmp_path / "records.jsonl.2").read_bytes() == b"second line\n"
+    assert not (tmp_path / "records.jsonl.3").exists()
+
+
+def test_appends_to_an_existing_file(tmp_path):
+    name = tmp_path / "records.jsonl"
+    name.write_bytes(b"kept\n")
+    f = RotatingFile(str(name), max_bytes=100, backups=2)
+    f.write(b"added\n")
+    f.flush()
+
+    assert name.read_bytes() == b"kept\nadded\n"
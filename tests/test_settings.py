@@ -0,0 +1,73 @@
+import os
+from types import SimpleNamespace
+import pytest
+import settings
+
+
+@pytest.fixture
+def watch(monkeypatch, tmp_path):
+    # Fresh callbacks and watched files, the real ones stay untouched.
+    for name in ("SETTINGS_PATH", "DEBUG_TOKEN", "ALLOW_TEST_BUILDS"):
+        monkeypatch.delenv(name, raising=False)
+    policy = tmp_path / "policy.json"
+    policy.write_text("{}")
+    monkeypatch.setenv("VERDICT_POLICY_PATH", str(policy))
+    monkeypatch.setattr(settings, "_callbacks", [])
+    monkeypatch.setattr(settings, "_mtimes", {})
+    monkeypatch.setattr(settings, "current", settings.load())
+    settings._changed_files(settings.current)
+
+    watch = SimpleNamespace(fired=[], policy=policy)
+    for names in [("debug_token",), ("allow_test_builds", "verdict_policy_path")]:
+        settings.on_change(names, lambda loaded, names=names: watch.fired.append(names))
+    return watch
+
+
+def test_no_change_fires_nothing(watch):
+    assert settings.reload() == set()
+    assert watch.fired == []
+
+
+def test_fires_only_the_callbacks_for_changed_settings(watch, monkeypatch):
+    monkeypatch.setenv("DEBUG_TOKEN", "secret")
+
+    assert settings.reload() == {"debug_token"}
+    assert watch.fired == [("debug_token",)]
+    assert settings.current.debug_token == "secret"
+
+
+def test_a_callback_fires_once_for_several_of_its_settings(watch, monkeypatch):
+    monkeypatch.setenv("ALLOW_TEST_BUILDS", "true")
+    monkeypatch.setenv("VERDICT_POLICY_PATH", str(watch.policy.with_name("b.json")))
+
+    assert settings.reload() == {"allow_test_builds", "verdict_policy_path"}
+    assert watch.fired == [("allow_test_builds", "verdict_policy_path")]
+
+
+def test_a_changed_watched_file_counts_as_a_change(watch):
+    mtime = os.stat(watch.policy).st_mtime_ns
+    os.utime(watch.policy, ns=(mtime + 10**9, mtime + 10**9))
+
+    assert settings.reload() == {"verdict_policy_path"}
+    assert watch.fired == [("allow_test_builds", "verdict_policy_path")]
+
+
+def test_invalid_settings_are_ignored(watch, monkeypatch):
+    before = settings.current
+    monkeypatch.setenv("ALLOW_TEST_BUILDS", "maybe")
+    monkeypatch.setenv("DEBUG_TOKEN", "secret")
+
+    assert settings.reload() == set()
+    assert settings.current is before
+    assert watch.fired == []
+
+
+def test_a_failing_callback_does_not_stop_the_others(watch, monkeypatch):
+    def fail(loaded):
+        raise RuntimeError("broken")
+
+    settings._callbacks.insert(0, (frozenset(["debug_token"]), fail))
+    monkeypatch.setenv("DEBUG_TOKEN", "secret")
+
+    assert settings.reload() == {"debug_token"}
+    assert watch.fired == [("debug_token",)]
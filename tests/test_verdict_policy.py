@@ -0,0 +1,155 @@
+import itertools
+import time
+import pytest
+import goog
+import verdict_policy
+from apps import registry as app_registry
+from constants import PLAY_RECOGNIZED, default_verdict_policy
+
+app = app_registry.default
+package = app.android_package
+
+
+def verdict(
+    nonce="nonce",
+    request_package=package,
+    package_name=package,
+    app_verdict=PLAY_RECOGNIZED,
+    device_verdicts=("MEETS_DEVICE_INTEGRITY",),
+    **app_integrity,
+):
+    return {
+        "tokenPayloadExternal": {
+            "requestDetails": {
+                "nonce": nonce,
+                "requestPackageName": request_package,
+                "timestampMillis": str(int(time.time() * 1000)),
+            },
+            "appIntegrity": {
+                "packageName": package_name,
+                "appRecognitionVerdict": app_verdict,
+                **app_integrity,
+            },
+            "deviceIntegrity": {"deviceRecognitionVerdict": list(device_verdicts)},
+        }
+    }
+
+
+def legacy_is_valid_verdict(verdict, nonce, allow_test_builds):
+    # isValidVerdict as it was before verdict policies.
+    try:
+        payload = verdict["tokenPayloadExternal"]
+        return (
+            payload["requestDetails"]["nonce"] == nonce
+            and payload["requestDetails"]["requestPackageName"] == package
+            and payload["appIntegrity"]["packageName"] == package
+            and {"MEETS_DEVICE_INTEGRITY"}.issubset(
+                payload["deviceIntegrity"]["deviceRecognitionVerdict"]
+            )
+            and (
+                payload["appIntegrity"]["appRecognitionVerdict"] == PLAY_RECOGNIZED
+                or allow_test_builds
+            )
+        )
+    except Exception:
+        return False
+
+
+@pytest.fixture
+def test_builds():
+    # Set the app's ALLOW_TEST_BUILDS override and rebuild its policy.
+    saved = app.test_builds, verdict_policy.policies
+
+    def set_test_builds(allowed):
+        app.test_builds = allowed
+        verdict_policy.policies = {
+            app.name: verdict_policy.VerdictPolicy(app, dict(default_verdict_policy))
+        }
+
+    yield set_test_builds
+    app.test_builds, verdict_policy.policies = saved
+
+
+@pytest.mark.parametrize(
+    "allow_test_builds, nonce, request_package, app_verdict, device_verdicts",
+    list(
+        itertools.product(
+            [False, True],
+            ["nonce", "other"],
+            [package, "com.example.other"],
+            [PLAY_RECOGNIZED, "UNRECOGNIZED_VERSION"],
+            [
+                (),
+                ("MEETS_BASIC_INTEGRITY",),
+                ("MEETS_DEVICE_INTEGRITY",),
+                ("MEETS_BASIC_INTEGRITY", "MEETS_DEVICE_INTEGRITY"),
+            ],
+        )
+    ),
+)
+def test_default_policy_matches_legacy_check(
+    test_builds, allow_test_builds, nonce, request_package, app_verdict, device_verdicts
+):
+    test_builds(allow_test_builds)
+    value = verdict(
+        nonce=nonce,
+        request_package=request_package,
+        app_verdict=app_verdict,
+        device_verdicts=device_verdicts,
+    )
+    assert goog.isValidVerdict(value, "nonce") == legacy_is_valid_verdict(
+        value, "nonce", allow_test_builds
+    )
+
+
+def test_rejects_an_unregistered_package():
+    value = verdict(request_package="com.example", package_name="com.example")
+    assert goog.isValidVerdict(value, "nonce") is False
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        {},
+        {"tokenPayloadExternal": None},
+        {"tokenPayloadExternal": {"requestDetails": {"nonce": "nonce"}}},
+    ],
+)
+def test_rejects_malformed_verdicts(value):
+    assert goog.isValidVerdict(value, "nonce") is False
+
+
+def evaluate(value, **policy):
+    checks = verdict_policy.VerdictPolicy(app, {**default_verdict_policy, **policy})
+    return checks.evaluate(value["tokenPayloadExternal"], "nonce")
+
+
+def test_min_version_code():
+    assert evaluate(verdict(versionCode="1200"), min_version_code=1200)
+    assert not evaluate(verdict(versionCode="1199"), min_version_code=1200)
+    assert not evaluate(verdict(), min_version_code=1200)
+
+
+def test_certificate_digests():
+    signed = verdict(certificateSha256Digest=["a", "b"])
+    assert evaluate(signed, certificate_digests=["b", "c"])
+    assert not evaluate(signed, certificate_digests=["c"])
+
+
+def test_max_age_seconds():
+    value = verdict()
+    assert evaluate(value, max_age_seconds=60)
+    requested = time.time() * 1000 - 120 * 1000
+    value["tokenPayloadExternal"]["requestDetails"]["timestampMillis"] = requested
+    assert not evaluate(value, max_age_seconds=60)
+
+
+def test_strong_integrity():
+    policy = {"device_verdicts": ["MEETS_STRONG_INTEGRITY"]}
+    assert not evaluate(verdict(), **policy)
+    assert evaluate(verdict(device_verdicts=["MEETS_STRONG_INTEGRITY"]), **policy)
+
+
+def test_rejects_unknown_rules():
+    with pytest.raises(ValueError, match="unknown"):
+        verdict_policy.VerdictPolicy(app, {"min_version": 1})